@@ -1,18 +1,20 @@
 # encoding: utf8
 
-from collections import defaultdict
-from datetime import date, datetime
 import importlib
-from operator import itemgetter
 import os
-from shutil import copyfile, rmtree
+from shutil import rmtree
 import sys
 import warnings
 
 from jinja2 import Environment, FileSystemLoader
-import toml
 
+from .cache import SourceCache
+from .dependencies import BuildState, RecordingDict
+from .index import SourceIndex, flatten_token_tree, token_tree
 from .lib import relative_list_of_files_in_directory
+from .output import OutputManifest, OutputWriter
+from .parallel import generate_in_parallel, load_in_parallel
+from .parsers import loads_toml
 from .sectileloader import SectileLoader
 from .source import (
     JsonSourceFile,
@@ -20,8 +22,11 @@ from .source import (
     SourceFile,
     TomlSourceFile,
     CsvSourceFile,
+    find_attachments,
+    index_attachments,
 )
 from .sourcelist import SourceList
+from .watcher import SourceWatcher
 from .version import __version__    # noqa: F401
 
 sys.dont_write_bytecode = True
@@ -37,6 +42,11 @@ class Flourish(object):
         fragments_dir=None,
         future=None,
         reloading=False,
+        cache_dir=None,
+        indexed=True,
+        legacy_ordering=None,
+        keep_markdown=None,
+        load_jobs=1,
     ):
         self.source_dir = source_dir
         self.templates_dir = templates_dir
@@ -45,11 +55,27 @@ class Flourish(object):
         self.sass_dir = sass_dir
         self.future = future
         self.reloading = reloading
+        self.cache_dir = cache_dir
+        self.indexed = indexed
+        self.legacy_ordering = legacy_ordering
+        self.keep_markdown = keep_markdown
+        self.load_jobs = load_jobs
         self._assets = {}
         self._cache = {}
+        self._read_files = {}
+        self._attachment_index = None
         self._source_files = []
         self._source_path = None
         self._paths = {}
+        self._build = None
+        self._recorder = None
+        self._source_index = None
+        self._sources_version = 0
+        self._prefetched = {}
+        self._watcher = None
+        self._global_context = None
+        self._all_sources = None
+        self.writer = OutputWriter()
 
         # using sectile fragments overrides standard filesystem templates
         if self.fragments_dir:
@@ -76,7 +102,20 @@ class Flourish(object):
             raise Flourish.RuntimeError(
                 'The source directory "%s" must exist' % self.source_dir)
 
-        self.site_config = self._read_site_config()
+        self._site_config = self._read_site_config()
+
+        # object instantiation takes precedence over site config
+        if self.keep_markdown is None:
+            self.keep_markdown = self._site_config.get('keep_markdown', True)
+
+        self._source_cache = None
+        if self.cache_dir is not None:
+            self._source_cache = SourceCache(
+                self.cache_dir,
+                self.source_dir,
+                settings={'keep_markdown': self.keep_markdown},
+            )
+
         self._rescan_sources()
 
         filename = '%s/generate.py' % self.source_dir
@@ -112,6 +151,12 @@ class Flourish(object):
             raise Flourish.RuntimeError(
                 'There are no paths configured in generate.py')
 
+    @property
+    def site_config(self):
+        if self._recorder is not None:
+            return RecordingDict(self._site_config, self._recorder)
+        return self._site_config
+
     @property
     def sources(self):
         try:
@@ -119,13 +164,22 @@ class Flourish(object):
         except KeyError:
             future = True
 
+        try:
+            legacy_ordering = self.site_config['legacy_ordering']
+        except KeyError:
+            legacy_ordering = False
+
         # object instantiation takes precedence over site config
         if self.future is not None:
             future = self.future
+        if self.legacy_ordering is not None:
+            legacy_ordering = self.legacy_ordering
 
         return SourceList(
             self._source_files,
-            future = future
+            parent = self,
+            future = future,
+            legacy_ordering = legacy_ordering,
         )
 
     @property
@@ -140,12 +194,22 @@ class Flourish(object):
                 redirects[prev] = src.path
         return redirects
 
+    def get_source_index(self):
+        """ The index used to filter sources, built when first needed. """
+        if not self.indexed:
+            return None
+        if self._source_index is None:
+            self._source_index = SourceIndex(self._source_files)
+        return self._source_index
+
     def get(self, slug):
         """ Get a single source document by slug. """
-        try:
-            return self._cache[slug]
-        except KeyError:
+        source = self._cache.get(slug)
+        if self._recorder is not None:
+            self._recorder.record_source(slug, source)
+        if source is None:
             raise SourceFile.DoesNotExist
+        return source
 
     def template_get(self, slug):
         try:
@@ -173,12 +237,15 @@ class Flourish(object):
 
     def template_resolve_path(self, name, **kwargs):
         try:
-            return self.resolve_path(name, **kwargs)
+            resolved = self.resolve_path(name, **kwargs)
         except KeyError:
             warnings.warn(
                 'Cannot resolve path "%s", it has missing arguments' % name
             )
-            return ''
+            resolved = ''
+        if self._recorder is not None:
+            self._recorder.record_path(name, kwargs, resolved)
+        return resolved
 
     def get_handler_for_path(self, path):
         matches = []
@@ -195,25 +262,133 @@ class Flourish(object):
         else:
             raise SourceFile.DoesNotExist
 
-    def generate_site(self, report=False):
-        if os.path.exists(self.output_dir):
-            rmtree(self.output_dir)
-        os.makedirs(self.output_dir)
-        self.generate_all_paths(report=report)
-        self.copy_assets(report=report)
+    def generate_site(self, report=False, jobs=1, incremental=False):
+        # worked out again for each build
+        self._global_context = None
+        if incremental:
+            self.generate_changed(report=report, jobs=jobs)
+            return
+        manifest = self._open_manifest()
+        try:
+            if manifest is None or not manifest.is_complete:
+                # nothing is known of what is already in the output
+                if os.path.exists(self.output_dir):
+                    rmtree(self.output_dir)
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.generate_all_paths(report=report, jobs=jobs)
+            self.copy_assets(report=report)
+            if manifest is not None:
+                for filename in manifest.unwritten():
+                    self.writer.remove(filename, self.output_dir, report)
+                manifest.save()
+        finally:
+            self.writer.manifest = None
+
+    def generate_all_paths(self, report=False, jobs=1):
+        if jobs != 1:
+            for _ in self._generate_units(self._all_units(), report, jobs):
+                pass
+        else:
+            with self.writer.in_background():
+                for path in self._paths:
+                    self._paths[path].generate(report)
+
+    def generate_changed(self, report=False, jobs=1):
+        """
+        Generate only the outputs whose sources, templates, site
+        configuration or paths have changed since the previous build,
+        and remove the outputs that would no longer be generated.
+        """
+        if self.cache_dir is None:
+            raise Flourish.RuntimeError(
+                'Generating incrementally requires a cache directory')
+
+        self._build = BuildState(self)
+        manifest = self._open_manifest()
+        try:
+            if not self._build.is_complete:
+                if os.path.exists(self.output_dir):
+                    rmtree(self.output_dir)
+                os.makedirs(self.output_dir)
+
+            units = []
+            for name, tokens in self._all_units():
+                if not self._build.is_current(name, tokens):
+                    units.append((name, tokens))
+            if jobs == 1:
+                # the workers of a parallel build write their own files
+                self.writer.start()
+            try:
+                results = self._generate_units(units, report, jobs)
+                for (name, tokens), dependencies in zip(units, results):
+                    self._build.update(name, tokens, dependencies)
+            finally:
+                self.writer.stop()
+
+            self._build.remove_stale_outputs(report=report)
+            self._build.copy_assets(report=report)
+            self._build.save()
+            manifest.save()
+        finally:
+            self._build = None
+            self.writer.manifest = None
+
+    def _open_manifest(self):
+        if self.cache_dir is None:
+            return None
+        self.writer.manifest = OutputManifest(self.output_dir, self.cache_dir)
+        return self.writer.manifest
+
+    def _all_units(self):
+        units = []
+        for name in self._paths:
+            for tokens in self._paths[name].get_path_tokens():
+                units.append((name, tokens))
+        return units
+
+    def _generate_units(self, units, report=False, jobs=1):
+        if jobs != 1:
+            # shared by the workers, rather than worked out by each
+            if hasattr(self, 'global_context'):
+                self.get_global_context()
+            return generate_in_parallel(self, units, jobs, report=report)
+        return (
+            self._generate_unit(name, tokens, report)
+            for name, tokens in units
+        )
 
-    def generate_all_paths(self, report=False):
-        for path in self._paths:
-            self._paths[path].generate(report)
+    def _generate_unit(self, name, tokens, report=False):
+        """
+        Generate the output for one generator and tokenset, returning
+        its dependencies when generating incrementally.
+        """
+        if self._build is None:
+            self._paths[name].generate(report, tokens=[tokens])
+            return None
+        with self._build.recording() as recorder:
+            self._paths[name].generate(report, tokens=[tokens])
+        return recorder.dependencies
 
     def generate_path(self, path, report=False):
-        if self.reloading:
+        if self.reloading and (
+            self._watcher is None or self._watcher.has_changed()
+        ):
             self._rescan_sources()
         handlers = self.get_handler_for_path(path)
         for key, args in handlers:
             path = self._paths[key]
             path.generate(report, tokens=[args])
 
+    def watch_sources(self, interval=1.0):
+        """
+        When reloading, check the source directory for changes in the
+        background every `interval` seconds, rather than scanning it again
+        for every path generated.
+        """
+        if self._watcher is None:
+            self._watcher = SourceWatcher(self.source_dir, interval)
+            self._watcher.start()
+
     def path_blueprint(self, path):
         handlers = self.get_handler_for_path(path)
         for key, args in handlers:
@@ -225,6 +400,41 @@ class Flourish(object):
 
     def set_global_context(self, global_context):
         self.global_context = global_context
+        self._global_context = None
+
+    def get_global_context(self, shared=True):
+        """
+        The global context for templates. Unless `shared` is False, it is
+        worked out once and given to every page until the sources change.
+        """
+        _version = self._sources_version
+        if (
+            shared and
+            self._global_context is not None and
+            self._global_context[0] == _version
+        ):
+            context = self._global_context[1]
+        else:
+            # what the global context itself reads is not recorded as a
+            # dependency of every page, only the resulting context
+            recorder, self._recorder = self._recorder, None
+            try:
+                context = self.global_context(self)
+            finally:
+                self._recorder = recorder
+            if shared:
+                self._global_context = (_version, context)
+        if self._recorder is not None:
+            self._recorder.record_global_context(context)
+        return context
+
+    def depends_on_file(self, filename):
+        """
+        Record that the output currently being generated depends upon
+        the contents of `filename`, for incremental generation.
+        """
+        if self._recorder is not None:
+            self._recorder.record_file(filename)
 
     def add_template_filters(self, filters):
         for key, value in filters.items():
@@ -232,38 +442,34 @@ class Flourish(object):
 
     def copy_assets(self, report=False):
         for _file in self._assets:
-            _source = '%s/%s' % (self.source_dir, _file)
-            _destination = '%s/%s' % (self.output_dir, _file)
-            _directory = os.path.dirname(_destination)
-            if not os.path.isdir(_directory):
-                os.makedirs(_directory)
-            copyfile(_source, _destination)
-            if report:
-                print('++', _destination)
+            self.copy_asset(_file, report=report)
+
+    def copy_asset(self, filename, report=False):
+        _source = '%s/%s' % (self.source_dir, filename)
+        _destination = '%s/%s' % (self.output_dir, filename)
+        self.writer.copy(_source, _destination)
+        if report:
+            print('++', _destination)
 
     def _read_site_config(self):
         _config_file = '%s/_site.toml' % self.source_dir
         try:
             with open(_config_file) as _file:
-                return toml.loads(_file.read())
+                return loads_toml(_file.read())
         except FileNotFoundError:
             return {}
 
     def _rescan_sources(self):
         """ Find source documents and register them. """
-        _seen = {}
-        for _file in relative_list_of_files_in_directory(self.source_dir):
-            if _file == '_site.toml':
-                continue
-            if _file.startswith('generate.py'):
-                continue
-            slug, _ = os.path.splitext(_file)
-            timestamp = os.stat(os.path.join(self.source_dir, _file)).st_mtime
-            try:
-                source = self.get(slug)
-                assert timestamp == source.timestamp
-                _seen[slug] = 1
-            except:     # noqa: E722
+        _sources = {}
+        _read_files = {}
+        _files = relative_list_of_files_in_directory(self.source_dir)
+        self._attachment_index = index_attachments(_files)
+        if self.load_jobs != 1:
+            self._prefetch_sources(_files)
+        for _file, slug, timestamp, current in self._scan_files(_files):
+            source_class = self._get_source_class(_file)
+            if source_class is None:
                 # FIXME check for slug-ishness and otherwise ignore
                 # (this could simplify _site.toml by being just another
                 # ignored filename?)
@@ -271,114 +477,168 @@ class Flourish(object):
                     _file.endswith(('.markdown', '.html')) and
                     len(_file.split('.')) == 3
                 )
+                if not is_attachment_file:
+                    self._assets[_file] = True
+                continue
 
-                if _file.endswith('.toml'):
-                    self._cache[slug] = TomlSourceFile(self, _file)
-                    _seen[slug] = 1
-                elif (
-                    _file.endswith('.markdown')
-                    and len(_file.split('.')) == 2
-                ):
-                    self._cache[slug] = MarkdownSourceFile(self, _file)
-                    _seen[slug] = 1
-                elif _file.endswith('.json'):
-                    self._cache[slug] = JsonSourceFile(self, _file)
-                    _seen[slug] = 1
-                elif _file.endswith('.csv'):
-                    for src in CsvSourceFile(self, _file).get_sources():
-                        if src['slug'] in _seen:
-                            warnings.warn(
-                                (
-                                    'Existing source "%s" has been '
-                                    'overriden by "%s"'
-                                ) % (
-                                    src['slug'],
-                                    src,
-                                )
+            if current:
+                # sources are registered again in order, so that which
+                # of them wins a clash of slugs is unchanged
+                _read = self._read_files[_file][2]
+            elif source_class is CsvSourceFile:
+                _read = []
+                for src in self._load_sources(CsvSourceFile, _file):
+                    if src['slug'] in _sources:
+                        warnings.warn(
+                            (
+                                'Existing source "%s" has been '
+                                'overriden by "%s"'
+                            ) % (
+                                src['slug'],
+                                src,
                             )
-                        self._cache[src['slug']] = src
-                        _seen[src['slug']] = 1
-                elif not is_attachment_file:
-                    self._assets[_file] = True
+                        )
+                    _read.append((src['slug'], src))
+            else:
+                _read = [(slug, self._load_sources(source_class, _file)[0])]
+            _read_files[_file] = (
+                timestamp, self._attachment_times(_read), _read)
+            for _slug, src in _read:
+                _sources[_slug] = src
 
-        # remove anything no longer there
+        # anything new, changed or no longer there
         # FIXME will also need output removing
-        _removed = {}
-        for source in self._cache:
-            if source not in _seen:
-                _removed[source] = 1
-        for source in _removed:
-            del self._cache[source]
+        _changed = list(_sources) != list(self._cache) or any(
+            src is not self._cache[_slug] for _slug, src in _sources.items()
+        )
 
+        self._prefetched = {}
+        self._read_files = _read_files
+        # updated in place, as source lists hold a view of the values
+        self._cache.clear()
+        self._cache.update(_sources)
         self._source_files = self._cache.values()
+        if _changed:
+            self._sources_changed()
+
+        if self._source_cache is not None:
+            self._source_cache.save(_files)
+
+    def _sources_changed(self):
+        """ Forget anything worked out from the previous sources. """
+        if self._source_index is not None:
+            self._source_index.update(self._source_files)
+        self._sources_version += 1
+
+    def _scan_files(self, filenames):
+        """
+        Each of `filenames` other than the site's own files, with its slug,
+        modification time and whether the sources read from it are current,
+        which includes their attachments being unchanged.
+        """
+        for _file in filenames:
+            if _file == '_site.toml' or _file.startswith('generate.py'):
+                continue
+            slug, _ = os.path.splitext(_file)
+            timestamp = os.stat(os.path.join(self.source_dir, _file)).st_mtime
+            previous = self._read_files.get(_file)
+            current = (
+                previous is not None and
+                timestamp == previous[0] and
+                self._attachment_times(previous[2]) == previous[1]
+            )
+            yield _file, slug, timestamp, current
+
+    def _attachment_times(self, sources):
+        """ The modification time of each attachment to `sources`. """
+        times = []
+        for _, src in sources:
+            for extension in ('markdown', 'html'):
+                for attachment in find_attachments(
+                    self.source_dir,
+                    src.slug,
+                    extension,
+                    self._attachment_index,
+                ):
+                    _filename = os.path.join(self.source_dir, attachment)
+                    times.append((attachment, os.stat(_filename).st_mtime))
+        return times
+
+    def _get_source_class(self, filename):
+        if filename.endswith('.toml'):
+            return TomlSourceFile
+        if filename.endswith('.markdown') and len(filename.split('.')) == 2:
+            return MarkdownSourceFile
+        if filename.endswith('.json'):
+            return JsonSourceFile
+        if filename.endswith('.csv'):
+            return CsvSourceFile
+        return None
+
+    def _prefetch_sources(self, filenames):
+        """
+        Read every source file that looks to have changed across several
+        processes, ahead of them being registered one by one in order.
+        """
+        _loads = []
+        for _file, slug, timestamp, current in self._scan_files(filenames):
+            source_class = self._get_source_class(_file)
+            if current or source_class is None:
+                continue
+            if (
+                self._source_cache is not None and
+                self._source_cache.is_current(
+                    _file, self._attachment_index)
+            ):
+                continue
+            _loads.append((source_class, _file))
+        if len(_loads) > 1:
+            self._prefetched = load_in_parallel(self, _loads, self.load_jobs)
+
+    def _load_sources(self, source_class, filename):
+        """ Read the sources in a file, unless already cached. """
+        def read_sources(parent, filename):
+            prefetched = self._prefetched.pop(filename, None)
+            if prefetched is None:
+                return source_class.read_sources(parent, filename)
+            states, messages = prefetched
+            for message in messages:
+                warnings.warn(message)
+            return [
+                cls._from_cached_state(parent, state)
+                for cls, state in states
+            ]
+
+        if self._source_cache is None:
+            return read_sources(self, filename)
+        return self._source_cache.load(self, read_sources, filename)
 
     @property
     def publication_dates(self):
-        def recursively_default_dict():
-            return defaultdict(recursively_default_dict)
-
-        _captured = recursively_default_dict()
-        for _source in self.sources.all():
-            try:
-                _date = getattr(_source, 'published')
-                _captured[_date.year][_date.month][_date.day] = 1
-            except AttributeError:
-                pass
-
-        _dates = []
-        for _year in sorted(_captured):
-            _months = []
-            for _month in sorted(_captured[_year]):
-                _days = []
-                for _day in sorted(_captured[_year][_month]):
-                    _days.append(date(_year, _month, _day))
-                _months.append({
-                    'month': date(_year, _month, 1),
-                    'days': _days
-                })
-            _dates.append({'year': date(_year, 1, 1), 'months': _months})
-        return _dates
+        return self.get_date_index().publication_dates()
+
+    def get_date_index(self, key='published'):
+        """
+        The dates in `key` of all sources, counted by year, month and day,
+        remembered until the sources change.
+        """
+        sources = self.sources
+        if (
+            self._all_sources is None or
+            self._all_sources.future != sources.future or
+            self._all_sources.legacy_ordering != sources.legacy_ordering
+        ):
+            self._all_sources = sources
+        return self._all_sources.get_date_index(key)
 
     def get_valid_filters_for_tokens(self, tokens, objects=None):
+        """
+        Every combination of values of `tokens` found in `objects`,
+        collected in one pass over the sources.
+        """
         if objects is None:
             objects = self.sources
-
-        _first_token = tokens[0]
-
-        _values = set()
-        for _source in objects:
-            _is_date_filter = (
-                _first_token in ['year', 'month', 'day'] and
-                'published' in _source and
-                type(_source['published'] == datetime)
-            )
-
-            if _is_date_filter:
-                _value = getattr(_source['published'], _first_token)
-                _values.add('%02d' % _value)
-            elif _first_token in _source:
-                if type(_source[_first_token]) is list:
-                    for _value in _source[_first_token]:
-                        _values.add(_value)
-                else:
-                    _values.add(_source[_first_token])
-
-        _filters = []
-        for _value in _values:
-            _dict = {_first_token: _value}
-            if len(tokens) == 1:
-                _filters.append(_dict)
-            else:
-                _sub_objects = objects.filter(**_dict)
-                _sub_tokens = self.get_valid_filters_for_tokens(
-                    tokens[1:], _sub_objects)
-                for _sub_token in _sub_tokens:
-                    _update = _dict.copy()
-                    _update.update(_sub_token)
-                    _filters.append(_update)
-
-        # the sort is only so the tests can compare results easily
-        return sorted(_filters, key=itemgetter(_first_token))
+        return flatten_token_tree(token_tree(list(objects), tokens), tokens)
 
     def __repr__(self):
         return '<flourish.Flourish object (source=%s)>' % self.source_dir
@@ -0,0 +1,176 @@
+import copyreg
+from hashlib import md5
+import os
+import pickle
+import warnings
+
+from toml.tz import TomlTz
+
+from .source import find_attachments
+from .version import __version__
+
+
+# the timezone attached to TOML datetimes cannot be pickled as it stands
+PICKLE_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+PICKLE_DISPATCH_TABLE[TomlTz] = lambda tz: (TomlTz, (tz._raw_offset,))
+
+
+class SourceCache:
+    """
+    A persistent cache of parsed sources, so that an unchanged source file
+    does not need to be read, parsed and have its Markdown converted again
+    each time Flourish starts.
+
+    Each source file is cached along with the path, modification time,
+    size and content hash of it and its attachments. A file whose time has
+    changed but whose content has not still counts as unchanged.
+
+    Markdown is usually converted the first time a key is used, which is
+    after the cache has been saved. So that an unchanged source never needs
+    converting again, sources being cached have all their Markdown
+    converted as they are read instead; a source that changes costs the
+    conversion of every key, used or not, once.
+    """
+    FILENAME = 'sources.pickle'
+
+    def __init__(self, cache_dir, source_dir, settings=None):
+        self.cache_dir = cache_dir
+        self.source_dir = source_dir
+        # anything else that changes how sources are read
+        self.settings = settings or {}
+        self._filename = os.path.join(cache_dir, self.FILENAME)
+        self._entries = self._read()
+        self._changed = False
+
+    def load(self, parent, loader, filename):
+        """
+        Return the sources found in `filename`, from the cache if nothing
+        has changed, otherwise by calling `loader(parent, filename)`.
+        """
+        entry = self._entries.get(filename)
+        if entry is not None and self._is_current(
+            entry, filename, parent._attachment_index
+        ):
+            for message in entry['warnings']:
+                warnings.warn(message)
+            return [
+                cls._from_cached_state(parent, state)
+                for cls, state in entry['sources']
+            ]
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            sources = loader(parent, filename)
+            for source in sources:
+                source._convert_markdown()
+        messages = [str(warning.message) for warning in caught]
+        for message in messages:
+            warnings.warn(message)
+
+        files = [filename]
+        for source in sources:
+            files.extend(source._attachments)
+        self._entries[filename] = {
+            'fingerprint': self._fingerprint(files),
+            'sources': [
+                (type(source), source._get_cached_state())
+                for source in sources
+            ],
+            'warnings': messages,
+        }
+        self._changed = True
+        return sources
+
+    def is_current(self, filename, attachments=None):
+        """ True if the sources in `filename` would come from the cache. """
+        entry = self._entries.get(filename)
+        return entry is not None and self._is_current(
+            entry, filename, attachments)
+
+    def save(self, filenames):
+        """
+        Write the cache to disk, forgetting any file not in `filenames`.
+        """
+        filenames = set(filenames)
+        for filename in list(self._entries):
+            if filename not in filenames:
+                del self._entries[filename]
+                self._changed = True
+        if not self._changed:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = '%s.%d' % (self._filename, os.getpid())
+        with open(temporary, 'wb') as handle:
+            pickler = pickle.Pickler(handle, pickle.HIGHEST_PROTOCOL)
+            pickler.dispatch_table = PICKLE_DISPATCH_TABLE
+            pickler.dump({
+                'version': __version__,
+                'source_dir': os.path.abspath(self.source_dir),
+                'settings': self.settings,
+                'entries': self._entries,
+            })
+        os.replace(temporary, self._filename)
+        self._changed = False
+
+    def _read(self):
+        try:
+            with open(self._filename, 'rb') as handle:
+                cached = pickle.load(handle)
+        except FileNotFoundError:
+            return {}
+        except Exception:
+            warnings.warn('Ignoring unreadable cache "%s"' % self._filename)
+            return {}
+        if (
+            cached.get('version') != __version__ or
+            cached.get('source_dir') != os.path.abspath(self.source_dir) or
+            cached.get('settings') != self.settings
+        ):
+            return {}
+        return cached['entries']
+
+    def _is_current(self, entry, filename, attachments):
+        files = [filename]
+        for _, state in entry['sources']:
+            for extension in ('markdown', 'html'):
+                files.extend(find_attachments(
+                    self.source_dir, state['_slug'], extension, attachments))
+        if set(files) != set(entry['fingerprint']):
+            return False
+
+        for _file in files:
+            mtime, size, digest = entry['fingerprint'][_file]
+            try:
+                stat = os.stat(os.path.join(self.source_dir, _file))
+            except FileNotFoundError:
+                return False
+            if stat.st_mtime == mtime and stat.st_size == size:
+                continue
+            if stat.st_size != size or self._digest(_file) != digest:
+                return False
+            # touched but unchanged
+            entry['fingerprint'][_file] = (stat.st_mtime, size, digest)
+            self._changed = True
+
+        # the source's own timestamp is checked when rescanning
+        timestamp = entry['fingerprint'][filename][0]
+        for _, state in entry['sources']:
+            if '_timestamp' in state:
+                state['_timestamp'] = timestamp
+        return True
+
+    def _fingerprint(self, files):
+        fingerprint = {}
+        for _file in files:
+            stat = os.stat(os.path.join(self.source_dir, _file))
+            fingerprint[_file] = (
+                stat.st_mtime,
+                stat.st_size,
+                self._digest(_file),
+            )
+        return fingerprint
+
+    def _digest(self, filename):
+        with open(os.path.join(self.source_dir, filename), 'rb') as handle:
+            return md5(handle.read()).hexdigest()
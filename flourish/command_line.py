@@ -15,6 +15,7 @@ from werkzeug.exceptions import NotFound
 from . import Flourish, __version__, blueprint
 from .examples import example_files
 from .lib import relative_list_of_files_in_directory
+from .output import OutputManifest
 from .dirtrie import DirTrie
 
 REDIRECT_ETAG = '"d41d8cd98f00b204e9800998ecf8427e"'      # 0 byte file
@@ -59,6 +60,19 @@ def main():
         default='output',
         help='Directory to output to (default: %(default)s)',
     )
+    parser.add_argument(
+        '--cache',
+        default='.flourish-cache',
+        help=(
+            'Directory to keep the parsed sources in between runs '
+            '(default: %(default)s)'
+        ),
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not cache the parsed sources between runs',
+    )
     parser.add_argument(
         '--version',
         action='store_true',
@@ -81,6 +95,24 @@ def main():
         action='store_true',
         help='Report each URL as it is generated'
     )
+    parser_generate.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help=(
+            'Number of processes to read sources and generate the site '
+            'with; 0 uses one per CPU (default: %(default)s)'
+        ),
+    )
+    parser_generate.add_argument(
+        '-i', '--incremental',
+        action='store_true',
+        help=(
+            'Only generate pages whose sources, templates or configuration '
+            'have changed since the last time, and remove pages that '
+            'no longer exist'
+        ),
+    )
     parser_generate.add_argument(
         '--include-future',
         action='store_true',
@@ -178,6 +210,9 @@ def main():
             args.templates = os.path.join(args.base, args.templates)
             args.fragments = os.path.join(args.base, args.fragments)
             args.output = os.path.join(args.base, args.output)
+            args.cache = os.path.join(args.base, args.cache)
+        if args.no_cache:
+            args.cache = None
         # find default 'fragments' directory but without forcing it
         if not os.path.isdir(args.fragments):
             args.fragments = None
@@ -198,6 +233,8 @@ def generate(args):
             fragments_dir=args.fragments,
             output_dir=args.output,
             future=future,
+            cache_dir=args.cache,
+            load_jobs=args.jobs,
         )
     except Flourish.MissingKey as e:
         sys.exit('Error: %s' % str(e))
@@ -207,7 +244,14 @@ def generate(args):
         for path in args.path:
             flourish.generate_path(path, report=args.verbose)
     else:
-        flourish.generate_site(report=args.verbose)
+        try:
+            flourish.generate_site(
+                report=args.verbose,
+                jobs=args.jobs,
+                incremental=args.incremental,
+            )
+        except Flourish.RuntimeError as e:
+            sys.exit('Error: %s' % str(e))
 
 
 def preview_server(args):
@@ -223,11 +267,14 @@ def preview_server(args):
             fragments_dir=args.fragments,
             output_dir=args.output,
             reloading=reloading,
+            cache_dir=args.cache,
         )
     except Flourish.MissingKey as e:
         sys.exit('Error: %s' % str(e))
     except Flourish.RuntimeError as e:
         sys.exit('Error: %s' % str(e))
+    if reloading:
+        flourish.watch_sources()
     app = Flask(__name__)
 
     # TODO 3xx redirects
@@ -361,8 +408,11 @@ def create_example(args):
         templates='templates',
         fragments=None,
         output='output',
+        cache=None,
         action='generate',
         verbose=True,
+        jobs=1,
+        incremental=False,
         include_future=True,
         exclude_future=False,
         path=[],
@@ -381,6 +431,7 @@ def upload(args):
             templates_dir=args.templates,
             fragments_dir=args.fragments,
             output_dir=args.output,
+            cache_dir=args.cache,
         )
     except Flourish.MissingKey as e:
         sys.exit('Error: %s' % str(e))
@@ -398,6 +449,10 @@ def upload(args):
     _s3 = boto3.resource('s3')
     _bucket = _s3.Bucket(_bucket_name)
     _files = relative_list_of_files_in_directory(args.output)
+    _manifest = None
+    if args.cache is not None:
+        # saves working out the digest of files unchanged since written
+        _manifest = OutputManifest(args.output, args.cache)
     _objects = dict()
     _invalidations = []
     for _object in _bucket.objects.all():
@@ -430,9 +485,14 @@ def upload(args):
                 _s3path = _path[:-5]
 
         _upload = True
-        _md5 = '"%s"' % md5(
-                open('%s/%s' % (args.output, _path), 'rb').read()
-            ).hexdigest()
+        _digest = None
+        if _manifest is not None:
+            _digest = _manifest.digest('%s/%s' % (args.output, _path))
+        if _digest is None:
+            _digest = md5(
+                    open('%s/%s' % (args.output, _path), 'rb').read()
+                ).hexdigest()
+        _md5 = '"%s"' % _digest
         try:
             if _md5 == _objects[_s3path].e_tag:
                 _upload = False
@@ -0,0 +1,393 @@
+from contextlib import contextmanager
+from hashlib import md5
+from io import BytesIO
+import os
+import pickle
+import warnings
+
+from jinja2 import meta
+
+from .cache import PICKLE_DISPATCH_TABLE
+from .lib import relative_list_of_files_in_directory
+from .source import SourceBase
+from .sourcelist import SourceList
+from .version import __version__
+
+
+MISSING = '-'
+
+
+class Dependencies:
+    """
+    Everything that was read while generating the output for one
+    generator and tokenset, and the files that were written.
+    """
+    def __init__(self):
+        self.outputs = []
+        self.sources = {}
+        self.queries = {}
+        self.templates = {}
+        self.config = {}
+        self.paths = {}
+        self.files = {}
+        self.global_context = None
+        self.unknown = False
+
+
+class DependencyRecorder:
+    def __init__(self, build):
+        self.build = build
+        self.dependencies = Dependencies()
+
+    def record_output(self, filename):
+        if filename not in self.dependencies.outputs:
+            self.dependencies.outputs.append(filename)
+
+    def record_source(self, slug, source):
+        self.dependencies.sources[slug] = self.build.source_digest(source)
+
+    def record_query(self, sourcelist, sources):
+        try:
+            query = self.build.query_key(sourcelist)
+        except Exception:
+            # cannot be compared on the next run, so always regenerate
+            self.dependencies.unknown = True
+            return
+        self.dependencies.queries[query] = self.build.describe_sources(
+            sources)
+
+    def record_template(self, name):
+        self.dependencies.templates[name] = self.build.template_digest(name)
+
+    def record_config(self, key):
+        self.dependencies.config[key] = self.build.config_digest(key)
+
+    def record_path(self, name, kwargs, resolved):
+        self.dependencies.paths[(name, _freeze(kwargs))] = resolved
+
+    def record_file(self, filename):
+        self.dependencies.files[filename] = self.build.file_digest(filename)
+
+    def record_global_context(self, context):
+        self.dependencies.global_context = \
+            self.build.global_context_digest(context)
+
+
+class RecordingDict(dict):
+    """
+    A copy of the site configuration that records which keys are used.
+    """
+    def __init__(self, config, recorder):
+        super().__init__(config)
+        self._recorder = recorder
+
+    def __getitem__(self, key):
+        self._recorder.record_config(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self._recorder.record_config(key)
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self._recorder.record_config(key)
+        return super().get(key, default)
+
+    def __iter__(self):
+        self._record_all()
+        return super().__iter__()
+
+    def keys(self):
+        self._record_all()
+        return super().keys()
+
+    def values(self):
+        self._record_all()
+        return super().values()
+
+    def items(self):
+        self._record_all()
+        return super().items()
+
+    def _record_all(self):
+        for key in super().keys():
+            self._recorder.record_config(key)
+
+
+class BuildState:
+    """
+    The dependencies of every output of the previous build, used to
+    regenerate only those outputs whose dependencies have changed.
+    """
+    FILENAME = 'dependencies.pickle'
+
+    def __init__(self, flourish):
+        self.flourish = flourish
+        self._filename = os.path.join(flourish.cache_dir, self.FILENAME)
+        self._build_digest = self._get_build_digest()
+        self.previous, self.previous_assets = self._read()
+        self.current = {}
+        self.assets = {}
+        self._digests = {}
+        self._queries = {}
+        self._templates = {}
+        self._global_context = None
+
+    @property
+    def is_complete(self):
+        """ False if there was no usable previous build. """
+        return self.previous is not None
+
+    @contextmanager
+    def recording(self):
+        recorder = DependencyRecorder(self)
+        self.flourish._recorder = recorder
+        try:
+            yield recorder
+        finally:
+            self.flourish._recorder = None
+
+    def is_current(self, name, tokens):
+        """
+        True (and the previous dependencies are kept) if the output for
+        this generator and tokenset does not need generating again.
+        """
+        key = (name, _freeze(tokens))
+        dependencies = (self.previous or {}).get(key)
+        if dependencies is None or dependencies.unknown:
+            return False
+
+        for filename in dependencies.outputs:
+            if not os.path.exists(filename):
+                return False
+        for slug, digest in dependencies.sources.items():
+            if digest != self.source_digest(self.flourish._cache.get(slug)):
+                return False
+        for template, digest in dependencies.templates.items():
+            if digest != self.template_digest(template):
+                return False
+        for config_key, digest in dependencies.config.items():
+            if digest != self.config_digest(config_key):
+                return False
+        for (path, kwargs), resolved in dependencies.paths.items():
+            if resolved != self.resolve_path(path, dict(kwargs)):
+                return False
+        for filename, digest in dependencies.files.items():
+            if digest != self.file_digest(filename):
+                return False
+        if dependencies.global_context is not None:
+            if dependencies.global_context != self.global_context_digest():
+                return False
+        for query, sources in dependencies.queries.items():
+            if sources != self.evaluate_query(query):
+                return False
+
+        self.current[key] = dependencies
+        return True
+
+    def update(self, name, tokens, dependencies):
+        """ Record the dependencies of a newly generated output. """
+        self.current[(name, _freeze(tokens))] = dependencies
+
+    def remove_stale_outputs(self, report=False):
+        """
+        Remove the outputs of the previous build that were not generated
+        this time, such as those that no longer have a tokenset.
+        """
+        written = set()
+        for dependencies in self.current.values():
+            written.update(dependencies.outputs)
+        for dependencies in (self.previous or {}).values():
+            for filename in dependencies.outputs:
+                if filename not in written:
+                    self._remove_output(filename, report)
+
+    def copy_assets(self, report=False):
+        """ Copy only the assets that have changed, remove the others. """
+        for _file in self.flourish._assets:
+            stat = os.stat(os.path.join(self.flourish.source_dir, _file))
+            self.assets[_file] = (stat.st_mtime, stat.st_size)
+            _destination = os.path.join(self.flourish.output_dir, _file)
+            if (
+                self.previous_assets.get(_file) != self.assets[_file]
+                or not os.path.exists(_destination)
+            ):
+                self.flourish.copy_asset(_file, report)
+        for _file in self.previous_assets:
+            if _file not in self.assets:
+                self._remove_output(
+                    os.path.join(self.flourish.output_dir, _file), report)
+
+    def save(self):
+        os.makedirs(self.flourish.cache_dir, exist_ok=True)
+        temporary = '%s.%d' % (self._filename, os.getpid())
+        with open(temporary, 'wb') as handle:
+            pickle.dump(
+                {
+                    'build': self._build_digest,
+                    'units': self.current,
+                    'assets': self.assets,
+                },
+                handle,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temporary, self._filename)
+
+    def source_digest(self, source):
+        if source is None:
+            return MISSING
+        if source.slug not in self._digests:
+            self._digests[source.slug] = _digest(_dumps((
+                type(source).__name__,
+                source.slug,
+                source._get_unconverted_config(),
+            )))
+        return self._digests[source.slug]
+
+    def describe_sources(self, sources):
+        return [
+            (source.slug, self.source_digest(source)) for source in sources
+        ]
+
+    def query_key(self, sourcelist):
+        return _dumps((
+            sourcelist.filters,
+            list(sourcelist.ordering),
+            sourcelist.slice,
+            sourcelist.future,
+            sourcelist.legacy_ordering,
+        ))
+
+    def evaluate_query(self, query):
+        if query not in self._queries:
+            filters, ordering, _slice, future, legacy = pickle.loads(query)
+            sources = SourceList(
+                self.flourish._source_files,
+                filters=filters,
+                ordering=ordering,
+                slice=_slice,
+                future=future,
+                legacy_ordering=legacy,
+            )
+            self._queries[query] = self.describe_sources(sources)
+        return self._queries[query]
+
+    def template_digest(self, name):
+        if name not in self._templates:
+            self._templates[name] = self._get_template_digest(name)
+        return self._templates[name]
+
+    def config_digest(self, key):
+        try:
+            return _digest(_dumps(self.flourish._site_config[key]))
+        except KeyError:
+            return MISSING
+
+    def resolve_path(self, name, kwargs):
+        try:
+            return self.flourish.resolve_path(name, **kwargs)
+        except KeyError:
+            return ''
+
+    def file_digest(self, filename):
+        try:
+            with open(filename, 'rb') as handle:
+                return _digest(handle.read())
+        except FileNotFoundError:
+            return MISSING
+
+    def global_context_digest(self, context=None):
+        # the shared global context is the same object for every page,
+        # so is only described once
+        if context is None:
+            context = self.flourish.get_global_context()
+        if (
+            self._global_context is None or
+            self._global_context[0] is not context
+        ):
+            self._global_context = (context, self.value_digest(context))
+        return self._global_context[1]
+
+    def value_digest(self, value):
+        return _digest(repr(self._describe(value)).encode('utf-8'))
+
+    def _describe(self, value):
+        if isinstance(value, SourceBase):
+            return ('source', value.slug, self.source_digest(value))
+        if isinstance(value, SourceList):
+            return ('sources', self.describe_sources(value))
+        if isinstance(value, dict):
+            return [(key, self._describe(value[key])) for key in value]
+        if isinstance(value, (list, tuple)):
+            return [self._describe(item) for item in value]
+        return repr(value)
+
+    def _get_template_digest(self, name):
+        jinja = self.flourish.jinja
+        if self.flourish.using_sectile:
+            return self._directory_digest(self.flourish.fragments_dir)
+        try:
+            source, _, _ = jinja.loader.get_source(jinja, name)
+        except Exception:
+            return MISSING
+        digests = [_digest(source.encode('utf-8'))]
+        for referenced in meta.find_referenced_templates(jinja.parse(source)):
+            if referenced is None:
+                # dynamically chosen, so could depend upon any template
+                return self._directory_digest(self.flourish.templates_dir)
+            digests.append(self.template_digest(referenced))
+        return _digest(''.join(digests).encode('utf-8'))
+
+    def _directory_digest(self, directory):
+        digests = []
+        for _file in relative_list_of_files_in_directory(directory):
+            digests.append(_file)
+            digests.append(self.file_digest(os.path.join(directory, _file)))
+        return _digest(''.join(digests).encode('utf-8'))
+
+    def _get_build_digest(self):
+        """
+        Changes to generate.py or Flourish itself, or a different output
+        directory, could change any output.
+        """
+        generate = os.path.join(self.flourish.source_dir, 'generate.py')
+        return (
+            __version__,
+            os.path.abspath(self.flourish.output_dir),
+            self.file_digest(generate),
+        )
+
+    def _read(self):
+        try:
+            with open(self._filename, 'rb') as handle:
+                state = pickle.load(handle)
+        except FileNotFoundError:
+            return None, {}
+        except Exception:
+            warnings.warn('Ignoring unreadable cache "%s"' % self._filename)
+            return None, {}
+        if state['build'] != self._build_digest:
+            return None, {}
+        if not os.path.isdir(self.flourish.output_dir):
+            return None, {}
+        return state['units'], state['assets']
+
+    def _remove_output(self, filename, report=False):
+        self.flourish.writer.remove(
+            filename, self.flourish.output_dir, report)
+
+
+def _freeze(tokens):
+    return tuple(sorted(tokens.items()))
+
+
+def _dumps(value):
+    output = BytesIO()
+    pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = PICKLE_DISPATCH_TABLE
+    pickler.dump(value)
+    return output.getvalue()
+
+
+def _digest(content):
+    return md5(content).hexdigest()
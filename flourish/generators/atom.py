@@ -1,5 +1,4 @@
 from datetime import datetime, timezone
-import os
 
 from feedgen.feed import FeedGenerator
 
@@ -100,16 +99,3 @@ class AtomGenerator(SourcesMixin, BaseGenerator):
 
     def get_entry_id(self, object):
         return object.absolute_url
-
-    # FIXME refactor
-    def output_to_file(self):
-        _filename = self.get_output_filename()
-        if self.report:
-            print('->', _filename)
-
-        _rendered = self.render_output()
-        _directory = os.path.dirname(_filename)
-        if not os.path.isdir(_directory):
-            os.makedirs(_directory)
-        with open(_filename, 'wb') as _output:
-            _output.write(_rendered)
@@ -1,5 +1,3 @@
-import os
-
 from .mixins import (
     PathMixin,
     SourcesMixin,
@@ -22,6 +20,7 @@ class BaseGenerator(ContextMixin, PathMixin, GeneratorMixin, TemplateMixin):
 
     def setup(self, flourish):
         self.flourish = flourish
+        self.compile_path()
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -33,12 +32,16 @@ class BaseGenerator(ContextMixin, PathMixin, GeneratorMixin, TemplateMixin):
         if self.report:
             print('->', filename)
 
-        rendered = self.render_output()
-        directory = os.path.dirname(filename)
-        if not os.path.isdir(directory):
-            os.makedirs(directory)
-        with open(filename, 'w', encoding='utf8') as output:
-            output.write(rendered)
+        self.write_output(filename, self.render_output())
+
+    def write_output(self, filename, content, newline=None):
+        """
+        Write `content` (text or bytes) to `filename` through the site's
+        shared output writer.
+        """
+        self.flourish.writer.write(filename, content, newline=newline)
+        if self.flourish._recorder is not None:
+            self.flourish._recorder.record_output(filename)
 
     def get_output_filename(self):
         destination = '%s%s' % (self.flourish.output_dir, self.current_path)
@@ -64,7 +67,7 @@ class SourceGenerator(SourcesMixin, PageTemplateMixin, BaseGenerator):
     def get_context_data(self):
         context = super().get_context_data()
         context['page'] = self.source_objects[0]
-        context.update(self.source_objects[0]._config)
+        context.update(self.source_objects[0].get_config())
         return context
 
 
@@ -1,10 +1,34 @@
 from datetime import date
 
 from flourish.generators.base import IndexGenerator
+from flourish.index import DATE_TOKENS
 
 
 class CalendarGenerator(IndexGenerator):
     order_by = 'published'
+    _calendar_sources = None
+
+    def get_publication_dates(self, **kwargs):
+        """
+        The publication dates of the sources on this page, from the dates
+        of all the generator's sources worked out once.
+        """
+        if (
+            self.limit is not None or
+            not set(self.tokens) <= set(DATE_TOKENS) or
+            self.flourish._recorder is not None
+        ):
+            # the page's sources are not only those on its dates, or
+            # only they should be recorded as a dependency
+            return self.source_objects.publication_dates
+        if (
+            self._calendar_sources is None or
+            self._calendar_sources[0] is not self.flourish
+        ):
+            self._calendar_sources = (
+                self.flourish, self.get_filtered_sources())
+        index = self._calendar_sources[1].get_date_index()
+        return index.publication_dates(**kwargs)
 
 
 class CalendarDayGenerator(CalendarGenerator):
@@ -30,7 +54,10 @@ class CalendarMonthGenerator(CalendarGenerator):
             month=int(self.tokens['month']),
             year=int(self.tokens['year']),
         )
-        dates = self.source_objects.publication_dates
+        dates = self.get_publication_dates(
+            year=_context['month'].year,
+            month=_context['month'].month,
+        )
         _context['publication_dates'] = dates[0]['months'][0]['days']
         return _context
 
@@ -45,6 +72,6 @@ class CalendarYearGenerator(CalendarGenerator):
             month=1,
             year=int(self.tokens['year']),
         )
-        dates = self.source_objects.publication_dates
+        dates = self.get_publication_dates(year=_context['year'].year)
         _context['publication_dates'] = dates[0]['months']
         return _context
@@ -1,5 +1,6 @@
 import csv
 from datetime import datetime
+from io import StringIO
 
 from flourish.generators.base import BaseGenerator
 from flourish.generators.mixins import SourcesMixin
@@ -11,16 +12,20 @@ class CSVGenerator(SourcesMixin, BaseGenerator):
 
     def output_to_file(self):
         filename = self.get_output_filename()
-        with open(filename, 'w', newline='') as handle:
-            output = csv.DictWriter(
-                handle,
-                fieldnames = self.get_fields(),
-                quoting=csv.QUOTE_MINIMAL,
-            )
-            output.writeheader()
-
-            for object in self.source_objects:
-                output.writerow(self.get_row(object))
+        if self.report:
+            print('->', filename)
+
+        handle = StringIO()
+        output = csv.DictWriter(
+            handle,
+            fieldnames = self.get_fields(),
+            quoting=csv.QUOTE_MINIMAL,
+        )
+        output.writeheader()
+
+        for object in self.source_objects:
+            output.writerow(self.get_row(object))
+        self.write_output(filename, handle.getvalue(), newline='')
 
     def get_fields(self):
         return self.fields
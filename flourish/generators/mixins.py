@@ -11,10 +11,14 @@ class MissingValue(Exception):
 
 
 class ContextMixin:
+    # set False to work out the global context again for every page
+    shared_global_context = True
+
     def get_context_data(self):
         context = {}
         context['site'] = self.flourish.site_config
-        context['global'] = self.flourish.global_context(self.flourish)
+        context['global'] = self.flourish.get_global_context(
+            shared=self.shared_global_context)
         context['tokens'] = self.tokens
         if self.context:
             context.update(**self.context)
@@ -24,29 +28,62 @@ class ContextMixin:
 class PathMixin:
     PATH_SEGMENTS = r'(#\w+)'
     STRIP_PATH = r'^[\w_-]+'
+    _valid_filters = None
+    _routes = None
+    _compiled_path = None
 
     def get_current_path(self, tokens):
         self.current_path = self.resolve(**tokens)
         return self.current_path
 
+    def compile_path(self):
+        """
+        Split `path` into its literal text and tokens, and build the
+        regular expression matching it, once rather than every time a URL
+        is resolved or matched.
+        """
+        self._split_path = re.split(self.PATH_SEGMENTS, self.path)
+        self._path_segments = []
+        self._path_arguments = []
+        pattern = ''
+        for segment in self._split_path:
+            if not segment.startswith('#'):
+                if segment:
+                    self._path_segments.append((None, segment))
+                    pattern += re.escape(segment)
+                continue
+            key = segment[1:]
+            self._path_segments.append((key, None))
+            if key in self._path_arguments:
+                pattern += '(?P=%s)' % key
+            elif key.isidentifier():
+                pattern += '(?P<%s>.*)' % key
+            else:
+                pattern += '(.*)'
+            self._path_arguments.append(key)
+        self._path_pattern = re.compile(pattern + r'\Z', re.DOTALL)
+        self._compiled_path = self.path
+
+    def get_path_segments(self):
+        if self._compiled_path != self.path:
+            self.compile_path()
+        return self._path_segments
+
     def resolve(self, **kwargs):
-        resolved = ''
-        # FIXME use self.arguments
-        for segment in re.split(self.PATH_SEGMENTS, self.path):
-            if segment.startswith('#'):
-                key = segment[1:]
-                if key in kwargs:
-                    if kwargs[key] is None:
-                        raise RuntimeError
-                    if key == 'month' or key == 'day':
-                        resolved = '%s%02d' % (resolved, int(kwargs[key]))
-                    else:
-                        resolved = '%s%s' % (resolved, kwargs[key])
+        resolved = []
+        for key, text in self.get_path_segments():
+            if key is None:
+                resolved.append(text)
+            elif key in kwargs:
+                if kwargs[key] is None:
+                    raise RuntimeError
+                if key == 'month' or key == 'day':
+                    resolved.append('%02d' % int(kwargs[key]))
                 else:
-                    raise KeyError
+                    resolved.append(str(kwargs[key]))
             else:
-                resolved = resolved + segment
-        return resolved
+                raise KeyError
+        return ''.join(resolved)
 
     def can_generate(self, path):
         subpath = None
@@ -58,7 +95,8 @@ class PathMixin:
         # expensive check-all-possible-matches, by checking if each
         # non-token part of the requested path is found in our path
         check_path = path
-        segments = re.split(self.PATH_SEGMENTS, self.path)
+        self.get_path_segments()
+        segments = list(self._split_path)
         while len(segments) > 1:
             if check_path == '?':
                 break
@@ -80,14 +118,45 @@ class PathMixin:
             elif not check_path.endswith(segments[0]):
                 return []
 
-        for _filter in self.all_valid_filters():
-            filter_path = self.resolve(**_filter)
-            if path == filter_path:
-                generates.append(_filter)
-            elif subpath and filter_path.startswith(subpath):
-                generates.append(_filter)
+        routes, resolved_filters = self.get_routes()
+        if subpath:
+            for filter_path, _filter in resolved_filters:
+                if path == filter_path or filter_path.startswith(subpath):
+                    generates.append(dict(_filter))
+        elif self.get_path_pattern().match(path):
+            for _filter in routes.get(path, []):
+                generates.append(dict(_filter))
         return generates
 
+    def get_routes(self):
+        """
+        The valid filters for this path by the URL each resolves to, and
+        a list of (URL, filter) pairs in the original order. These are
+        remembered until the sources change.
+        """
+        key = (self.flourish, self.flourish._sources_version)
+        if (
+            self._routes is None or
+            self._routes[0] != key or
+            self.flourish._recorder is not None
+        ):
+            routes = {}
+            resolved_filters = []
+            for _filter in self.all_valid_filters():
+                filter_path = self.resolve(**_filter)
+                routes.setdefault(filter_path, []).append(_filter)
+                resolved_filters.append((filter_path, _filter))
+            self._routes = (key, (routes, resolved_filters))
+        return self._routes[1]
+
+    def get_path_pattern(self):
+        """
+        A regular expression matching any URL this path could resolve
+        to, with a named group for each token.
+        """
+        self.get_path_segments()
+        return self._path_pattern
+
     def all_valid_filters(self):
         valid_filters = []
         args = self.arguments
@@ -95,21 +164,31 @@ class PathMixin:
         if len(args) == 0:
             valid_filters.append({})
         else:
-            filters = self.flourish.get_valid_filters_for_tokens(
-                args,
-                self.get_filtered_sources(),
-            )
-            for _filter in filters:
-                valid_filters.append(_filter)
+            for _filter in self.get_valid_filters(args):
+                valid_filters.append(dict(_filter))
         return valid_filters
 
+    def get_valid_filters(self, args):
+        """
+        The tokensets for `args`, which are remembered until the sources
+        change.
+        """
+        if self.flourish._recorder is not None:
+            # the sources used need recording as a dependency
+            return self.flourish.get_valid_filters_for_tokens(
+                args, self.get_filtered_sources())
+
+        key = (self.flourish, self.flourish._sources_version, tuple(args))
+        if self._valid_filters is None or self._valid_filters[0] != key:
+            filters = self.flourish.get_valid_filters_for_tokens(
+                args, self.get_filtered_sources())
+            self._valid_filters = (key, filters)
+        return self._valid_filters[1]
+
     @property
     def arguments(self):
-        arguments = []
-        for segment in re.split(self.PATH_SEGMENTS, self.path):
-            if segment.startswith('#'):
-                arguments.append(segment[1:])
-        return arguments
+        self.get_path_segments()
+        return list(self._path_arguments)
 
     def get_context_data(self):
         context = super().get_context_data()
@@ -119,6 +198,27 @@ class PathMixin:
 
 class SourcesMixin:
     order_by = None
+    # what Flourish keeps only to speed up generation, which would swamp
+    # the blueprint page
+    blueprint_omitted_state = (
+        '_cache',
+        '_source_index',
+        '_read_files',
+        '_attachment_index',
+        '_prefetched',
+        '_all_sources',
+        '_global_context',
+        'writer',
+    )
+    # likewise for each path
+    blueprint_omitted_path_state = (
+        '_valid_filters',
+        '_routes',
+    )
+    # and for each source, wherever it appears
+    blueprint_omitted_source_state = (
+        '_path_memo',
+    )
     sources_exclude = None
     sources_filter = None
     limit = None
@@ -186,7 +286,16 @@ class GeneratorMixin:
             )
         # do not need to see all this data in the blueprint page
         if 'page' in obj:
-            del obj['page']['_parent']['_cache']
+            parent = obj['page']['_parent']
+            for key in self.blueprint_omitted_state:
+                parent.pop(key, None)
+            paths = list((parent.get('_paths') or {}).values())
+            paths.append(parent.get('_source_path'))
+            for path in paths:
+                if type(path) is dict:
+                    for key in self.blueprint_omitted_path_state:
+                        path.pop(key, None)
+        self._omit_source_state(obj)
         context_string = json.dumps(obj, indent=2)
 
         global_context_string = json.dumps(
@@ -197,6 +306,16 @@ class GeneratorMixin:
         )
         return context_string, global_context_string
 
+    def _omit_source_state(self, obj):
+        if type(obj) is dict:
+            for key in self.blueprint_omitted_source_state:
+                obj.pop(key, None)
+            obj = obj.values()
+        elif type(obj) is not list:
+            return
+        for value in obj:
+            self._omit_source_state(value)
+
     def get_blueprint(self, tokens):
         for tokenset in tokens:
             self.tokens = tokenset
@@ -262,6 +381,8 @@ class TemplateMixin:
         name = self.get_template_name()
         if name is None:
             raise MissingValue
+        if self.flourish._recorder is not None:
+            self.flourish._recorder.record_template(name)
         if self.flourish.using_sectile:
             # Sectile templates need to be constructed rather than just found
             # on the filesystem. Because the entrypoint to the jinja loader
@@ -17,12 +17,15 @@ class SassGenerator(BaseGenerator):
         self.find_sass_sources()
 
     def find_sass_sources(self):
+        # found afresh, not added to those of another site (or the class)
+        sass_sources = []
         for root, dirs, files in os.walk(self.flourish.sass_dir):
             root = root[len(self.flourish.sass_dir):]
             for file in files:
                 base, ext = os.path.splitext(file)
                 if not base.startswith('_') and ext == '.scss':
-                    self.sass_sources.append(os.path.join(root, base))
+                    sass_sources.append(os.path.join(root, base))
+        self.sass_sources = sass_sources
 
     def get_path_tokens(self):
         tokens = []
@@ -48,6 +51,10 @@ class SassGenerator(BaseGenerator):
         pass
 
     def render_output(self):
+        # any partial could be imported, so depend upon all of them
+        for root, dirs, files in os.walk(self.flourish.sass_dir):
+            for file in files:
+                self.flourish.depends_on_file(os.path.join(root, file))
         source = os.path.join(
             self.flourish.sass_dir,
             '%s.scss' % self.tokens['sass_source'],
@@ -0,0 +1,235 @@
+from collections import defaultdict
+
+from .sourcelist import field_accessor, split_filter
+
+
+DATE_TOKENS = ('year', 'month', 'day')
+
+
+class FieldIndex:
+    def __init__(self):
+        # sources by each value, or each item when the value is a list
+        self.values = defaultdict(set)
+        # sources by their value, when that is not a list
+        self.whole = defaultdict(set)
+        # sources without this field
+        self.missing = set()
+
+    def add(self, source, value):
+        if value is None:
+            self.missing.add(source)
+        if type(value) is list:
+            for _item in value:
+                self.values[_item].add(source)
+        else:
+            self.values[value].add(source)
+            self.whole[value].add(source)
+
+    def remove(self, source, value):
+        self.missing.discard(source)
+        items = value if type(value) is list else (value,)
+        for _item in items:
+            self.values[_item].discard(source)
+            if not self.values[_item]:
+                del self.values[_item]
+        if type(value) is not list:
+            self.whole[value].discard(source)
+            if not self.whole[value]:
+                del self.whole[value]
+
+
+class SourceIndex:
+    """
+    An inverted index of the sources by the values of their fields,
+    including the `year`, `month` and `day` of `published`, so that
+    filtering with `eq`, `in`, `set` or `unset` does not need to test
+    every source. This includes the reverse lookups of foreign keys
+    (`source.thing_set` filters on `thing_fkey`) and `source.related()`.
+
+    Each field is indexed the first time it is filtered upon, and kept
+    up to date as sources are added and removed.
+    """
+    OPERATORS = ('eq', 'in', 'set', 'unset')
+
+    def __init__(self, sources):
+        self._fields = {}
+        self._set_sources(sources)
+
+    def _set_sources(self, sources):
+        self.sources = list(sources)
+        self._positions = {
+            source: _pos for _pos, source in enumerate(self.sources)}
+        self._all = set(self.sources)
+        self._types = set(type(source) for source in self.sources)
+
+    def update(self, sources):
+        """
+        Change the indexed sources to `sources`, only indexing the fields
+        of those that are new, rather than starting again.
+        """
+        previous, previous_all = self.sources, self._all
+        self._set_sources(sources)
+        removed = [_s for _s in previous if _s not in self._positions]
+        added = [_s for _s in self.sources if _s not in previous_all]
+        for field in list(self._fields):
+            index = self._fields[field]
+            if index is None or not self._can_index(field):
+                del self._fields[field]
+                continue
+            accessor = field_accessor(field)
+            try:
+                for source in removed:
+                    index.remove(source, accessor(source))
+                for source in added:
+                    index.add(source, accessor(source))
+            except TypeError:
+                # unhashable values
+                self._fields[field] = None
+
+    def filter(self, filters):
+        """
+        Use the index to apply as many of `filters` as possible,
+        returning the matching sources in order and the positions within
+        `filters` of those still to be tested, or None if no filter could
+        be used.
+        """
+        matched = None
+        remaining = []
+        for _pos, (key, value) in enumerate(filters):
+            sources = self.lookup(key, value)
+            if sources is None:
+                remaining.append(_pos)
+            elif matched is None:
+                matched = sources
+            else:
+                matched = matched & sources
+
+        if matched is None:
+            return None
+        return sorted(matched, key=self._positions.__getitem__), remaining
+
+    def lookup(self, key, test):
+        """
+        The sources matching one filter, or None if the index cannot be
+        used for it.
+        """
+        try:
+            field, operator = split_filter(key)
+        except ValueError:
+            return None
+        if operator not in self.OPERATORS:
+            return None
+
+        index = self._get_field(field)
+        if index is None:
+            return None
+
+        if operator == 'set':
+            return self._all - index.missing
+        if operator == 'unset':
+            return set(index.missing)
+        if operator == 'eq':
+            try:
+                return set(index.values.get(test, ()))
+            except TypeError:
+                # every value indexed is hashable, so none can equal
+                # (or be a list containing) an unhashable one
+                return set()
+
+        # `in` with a string tests for a substring, so only lists of
+        # values can be looked up
+        if type(test) not in (list, tuple):
+            return None
+        sources = set()
+        try:
+            for _value in test:
+                sources.update(index.whole.get(_value, ()))
+        except TypeError:
+            return None
+        return sources
+
+    def _get_field(self, field):
+        if field not in self._fields:
+            self._fields[field] = self._build_field(field)
+        return self._fields[field]
+
+    def _can_index(self, field):
+        # other attributes of a source, such as `path`, are not
+        # simple values that can be indexed
+        if field != 'slug' and any(hasattr(_t, field) for _t in self._types):
+            return False
+        if field.startswith('_') or field.endswith('_set'):
+            return False
+        return True
+
+    def _build_field(self, field):
+        if not self._can_index(field):
+            return None
+
+        index = FieldIndex()
+        accessor = field_accessor(field)
+        try:
+            for source in self.sources:
+                index.add(source, accessor(source))
+        except TypeError:
+            # unhashable values
+            return None
+        return index
+
+
+def token_tree(sources, tokens):
+    """
+    Every value of the first of `tokens` that `sources` have, each with
+    the tree of values of the remaining tokens found in the sources that
+    the filter `token=value` would match. The values of the last token
+    have None in place of a tree.
+    """
+    token = tokens[0]
+    accessor = field_accessor(token)
+    matching = {}
+    valid = set()
+    for source in sources:
+        value = accessor(source)
+        if token in DATE_TOKENS and 'published' in source:
+            offered = value is not None
+        else:
+            offered = token in source
+
+        # a source with a list of values is matched by each of them
+        items = value if type(value) is list else (value,)
+        for item in items:
+            try:
+                group = matching.setdefault(item, [])
+            except TypeError:
+                if offered:
+                    raise
+                continue
+            if not group or group[-1] is not source:
+                group.append(source)
+            if offered:
+                valid.add(item)
+
+    tree = {}
+    for value in valid:
+        if len(tokens) == 1:
+            tree[value] = None
+        else:
+            subtree = token_tree(matching[value], tokens[1:])
+            if subtree:
+                tree[value] = subtree
+    return tree
+
+
+def flatten_token_tree(tree, tokens):
+    """ The tokensets in `tree`, ordered by each token's value in turn. """
+    token = tokens[0]
+    tokensets = []
+    for value in sorted(tree):
+        if tree[value] is None:
+            tokensets.append({token: value})
+        else:
+            for subset in flatten_token_tree(tree[value], tokens[1:]):
+                tokenset = {token: value}
+                tokenset.update(subset)
+                tokensets.append(tokenset)
+    return tokensets
@@ -0,0 +1,280 @@
+from contextlib import contextmanager
+from hashlib import md5
+import os
+import pickle
+import queue
+from shutil import copyfile
+import threading
+import warnings
+
+
+class OutputWriter:
+    """
+    Writes the generated files for every generator. Each output directory
+    is only created once, and while writing in the background the files
+    are written by a separate thread, so the next page can be rendered
+    while the previous one is still being written to disk.
+
+    Given a `manifest`, files whose content is the same as last time are
+    not written again.
+    """
+
+    def __init__(self, batch_size=32):
+        self.batch_size = batch_size
+        self.manifest = None
+        self._directories = set()
+        self._pending = []
+        self._queue = None
+        self._thread = None
+        self._error = None
+
+    def write(self, filename, content, newline=None):
+        """
+        Write `content` to `filename`, as bytes or as UTF-8 text (with
+        `newline` as for `open`), creating its directory if needed.
+        """
+        self._add(self._write, filename, content, newline)
+
+    def copy(self, source, filename):
+        """ Copy the file `source` to `filename`. """
+        self._add(self._copy, source, filename)
+
+    def remove(self, filename, output_dir, report=False):
+        """
+        Remove `filename`, and any directories left empty by doing so up
+        to (but not including) `output_dir`.
+        """
+        if self.manifest is not None:
+            self.manifest.forget(filename)
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+        else:
+            if report:
+                print('--', filename)
+
+        top = os.path.abspath(output_dir)
+        directory = os.path.dirname(filename)
+        while os.path.abspath(directory).startswith(top + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # not empty, or already gone
+                break
+            self._directories.discard(directory)
+            directory = os.path.dirname(directory)
+
+    def start(self):
+        """ Write any further files in a background thread. """
+        if self._thread is None:
+            self._queue = queue.Queue(maxsize=4)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Wait for everything to be written, and write any further files
+        immediately. Errors from writing in the background are raised here.
+        """
+        if self._thread is not None:
+            self._hand_over()
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+            self._thread = None
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    @contextmanager
+    def in_background(self):
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def _add(self, function, *args):
+        if self._thread is None:
+            function(*args)
+            return
+        self._pending.append((function, args))
+        if len(self._pending) >= self.batch_size:
+            self._hand_over()
+
+    def _hand_over(self):
+        if self._pending:
+            self._queue.put(self._pending)
+            self._pending = []
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is not None:
+                # still drained, so the renderer is never left waiting
+                continue
+            try:
+                for function, args in batch:
+                    function(*args)
+            except Exception as error:
+                self._error = error
+
+    def _write(self, filename, content, newline):
+        if type(content) is not bytes:
+            # as written by open() in text mode
+            if newline != '':
+                content = content.replace('\n', newline or os.linesep)
+            content = content.encode('utf8')
+
+        digest = None
+        if self.manifest is not None:
+            digest = md5(content).hexdigest()
+        self._output(filename, digest, self._open_and_write, content)
+
+    def _copy(self, source, filename):
+        digest = None
+        if self.manifest is not None:
+            # read in chunks, as an asset could be large
+            hashed = md5()
+            with open(source, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(1 << 20), b''):
+                    hashed.update(chunk)
+            digest = hashed.hexdigest()
+        self._output(filename, digest, copyfile, source)
+
+    def _output(self, filename, digest, put, content):
+        """
+        Unless the manifest shows `filename` already has the content with
+        `digest`, create its directory if needed and `put` the content.
+        """
+        manifest = self.manifest
+        if manifest is not None and manifest.digest(filename) == digest:
+            manifest.keep(filename)
+            return
+
+        directory = os.path.dirname(filename)
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        try:
+            put(content, filename)
+        except FileNotFoundError:
+            # the directory has been removed since, such as by a new build
+            os.makedirs(directory, exist_ok=True)
+            put(content, filename)
+        if manifest is not None:
+            manifest.record(filename, digest)
+
+    def _open_and_write(self, content, filename):
+        with open(filename, 'wb') as output:
+            output.write(content)
+
+
+class OutputManifest:
+    """
+    The MD5 digest of every file in the output directory, as of when it
+    was written, kept in the cache directory between builds. A file that
+    has not been touched since (having the same size and modification
+    time) need not be written again if its content is the same, nor its
+    digest worked out again when uploading.
+    """
+    FILENAME = 'outputs.pickle'
+
+    def __init__(self, output_dir, cache_dir):
+        self.output_dir = output_dir
+        self._filename = os.path.join(cache_dir, self.FILENAME)
+        self.previous = self._read()
+        self.current = {}
+
+    @property
+    def is_complete(self):
+        """ False if there was no usable manifest of a previous build. """
+        return self.previous is not None
+
+    def digest(self, filename):
+        """ The digest of `filename`, if it is known to be current. """
+        key = self._key(filename)
+        entry = self.current.get(key)
+        if entry is None and self.previous is not None:
+            entry = self.previous.get(key)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        if entry[1:] != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return entry[0]
+
+    def record(self, filename, digest):
+        stat = os.stat(filename)
+        self.current[self._key(filename)] = (
+            digest, stat.st_size, stat.st_mtime_ns)
+
+    def keep(self, filename):
+        """ Note that the unchanged `filename` is still an output. """
+        key = self._key(filename)
+        if key not in self.current:
+            self.current[key] = self.previous[key]
+
+    def forget(self, filename):
+        key = self._key(filename)
+        self.current.pop(key, None)
+        if self.previous is not None:
+            self.previous.pop(key, None)
+
+    def take(self):
+        """ The files written since last asked, for a parallel build. """
+        written, self.current = self.current, {}
+        return written
+
+    def unwritten(self):
+        """ The outputs of the previous build not written by this one. """
+        return [
+            os.path.join(self.output_dir, key)
+            for key in (self.previous or {})
+            if key not in self.current
+        ]
+
+    def save(self):
+        """
+        Save the files written, along with those of the previous build
+        that have not since been removed (such as the outputs not
+        generated again in an incremental build).
+        """
+        files = dict(self.previous or {})
+        files.update(self.current)
+        os.makedirs(os.path.dirname(self._filename), exist_ok=True)
+        temporary = '%s.%d' % (self._filename, os.getpid())
+        with open(temporary, 'wb') as handle:
+            pickle.dump(
+                {
+                    'output_dir': os.path.abspath(self.output_dir),
+                    'files': files,
+                },
+                handle,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temporary, self._filename)
+
+    def _key(self, filename):
+        return os.path.relpath(filename, self.output_dir)
+
+    def _read(self):
+        try:
+            with open(self._filename, 'rb') as handle:
+                state = pickle.load(handle)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            warnings.warn('Ignoring unreadable cache "%s"' % self._filename)
+            return None
+        if state['output_dir'] != os.path.abspath(self.output_dir):
+            return None
+        if not os.path.isdir(self.output_dir):
+            return None
+        return state['files']
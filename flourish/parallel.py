@@ -0,0 +1,134 @@
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+import multiprocessing
+import os
+import pickle
+import sys
+import warnings
+
+from .cache import PICKLE_DISPATCH_TABLE
+
+
+# the Flourish object being generated; set before the worker processes
+# are forked, so each inherits it with its sources already loaded
+_flourish = None
+
+
+def generate_in_parallel(flourish, units, jobs, report=False):
+    """
+    Generate each (generator name, tokenset) pair in `units` across `jobs`
+    worker processes, returning the result of each in the same order.
+    """
+    global _flourish
+
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    units = [(name, tokens, report) for name, tokens in units]
+    results = []
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        warnings.warn(
+            'cannot generate in parallel on this platform, '
+            'generating serially instead'
+        )
+        for unit in units:
+            output, result = _generate(flourish, *unit)
+            sys.stdout.write(output)
+            results.append(result)
+        return results
+
+    chunksize = max(1, len(units) // (jobs * 4))
+    context = multiprocessing.get_context('fork')
+
+    # anything still buffered would otherwise be output again by each worker
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    _flourish = flourish
+    try:
+        with context.Pool(jobs) as pool:
+            # results are collected in order, so the report is identical
+            # to that of a serial build
+            for output, result, written in pool.imap(
+                _generate_unit, units, chunksize
+            ):
+                sys.stdout.write(output)
+                results.append(result)
+                if written:
+                    flourish.writer.manifest.current.update(written)
+    finally:
+        _flourish = None
+    return results
+
+
+def _generate_unit(unit):
+    output, result = _generate(_flourish, *unit)
+    # the files this worker wrote, for the manifest of the main process
+    manifest = _flourish.writer.manifest
+    written = manifest.take() if manifest is not None else None
+    return output, result, written
+
+
+def _generate(flourish, name, tokens, report):
+    captured = StringIO()
+    with redirect_stdout(captured):
+        result = flourish._generate_unit(name, tokens, report)
+    return captured.getvalue(), result
+
+
+def load_in_parallel(flourish, files, jobs):
+    """
+    Read the sources in each (source class, filename) pair in `files`
+    across `jobs` worker processes. Returns a dict of filename to the
+    classes and states of the sources found, along with any warnings,
+    ready for `_from_cached_state`.
+    """
+    global _flourish
+
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        # sources are then read as they are needed
+        return {}
+
+    chunksize = max(1, len(files) // (jobs * 4))
+    context = multiprocessing.get_context('fork')
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    loaded = {}
+    _flourish = flourish
+    try:
+        with context.Pool(jobs) as pool:
+            results = pool.imap(_load_file, files, chunksize)
+            for (_, filename), result in zip(files, results):
+                if result is not None:
+                    loaded[filename] = pickle.loads(result)
+    finally:
+        _flourish = None
+    return loaded
+
+
+def _load_file(unit):
+    source_class, filename = unit
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            sources = source_class.read_sources(_flourish, filename)
+        if _flourish._source_cache is not None:
+            # as the cache would, but spread across the workers
+            for source in sources:
+                source._convert_markdown()
+    except Exception:
+        # read it again in turn, so any error is raised as usual
+        return None
+    states = [(type(source), source._get_cached_state()) for source in sources]
+    messages = [str(warning.message) for warning in caught]
+
+    # the states can include datetimes with a TOML timezone
+    output = BytesIO()
+    pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = PICKLE_DISPATCH_TABLE
+    pickler.dump((states, messages))
+    return output.getvalue()
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+import re
+
+import toml
+from toml.tz import TomlTz
+
+try:
+    import tomllib
+except ImportError:     # Python 3.10 and earlier
+    tomllib = None
+
+
+ISO8601 = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}Z$')
+
+
+def loads_toml(text):
+    """
+    Parse TOML, with the faster `tomllib` where there is one. The values
+    are the same as the `toml` package gives, down to the timezone of each
+    datetime.
+    """
+    if tomllib is None:
+        return toml.loads(text)
+    return _toml_timezones(tomllib.loads(text), {})
+
+
+def _toml_timezones(value, timezones):
+    if type(value) is dict:
+        for _key, _value in value.items():
+            value[_key] = _toml_timezones(_value, timezones)
+    elif type(value) is list:
+        for _pos, _value in enumerate(value):
+            value[_pos] = _toml_timezones(_value, timezones)
+    elif type(value) is datetime and value.tzinfo is not None:
+        offset = value.utcoffset()
+        if offset not in timezones:
+            if offset == timedelta(0):
+                timezones[offset] = TomlTz('Z')
+            else:
+                sign = '-' if offset < timedelta(0) else '+'
+                minutes = abs(offset) // timedelta(minutes=1)
+                timezones[offset] = TomlTz(
+                    '%s%02d:%02d' % (sign, minutes // 60, minutes % 60))
+        value = value.replace(tzinfo=timezones[offset])
+    return value
+
+
+def parse_timestamp(value):
+    """
+    `value` as a UTC datetime if it is a string holding an ISO 8601
+    timestamp (eg. "2016-06-04T10:00:00Z"), otherwise unchanged.
+    """
+    # only a string of the right length (allowing for the trailing
+    # newline the pattern permits) is worth matching
+    if type(value) is str and 19 < len(value) < 22 and ISO8601.match(value):
+        return datetime.strptime(
+                value, "%Y-%m-%dT%H:%M:%SZ"
+            ).replace(tzinfo=timezone.utc)
+    return value
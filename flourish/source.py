@@ -1,17 +1,65 @@
 import codecs
 import csv
-from datetime import datetime, timezone
 from glob import glob
 import json
 import os
 import re
+import sys
 import warnings
 
 import markdown2
-import toml
+
+from .parsers import ISO8601, loads_toml, parse_timestamp
+
+
+def find_attachments(source_dir, slug, extension, index=None):
+    """
+    Find the files attached to the source `slug` (eg. "slug.body.html"),
+    relative to `source_dir`, from `index` if given.
+    """
+    if index is not None:
+        return index.get((slug, extension), [])
+    _trim = len(source_dir) + 1
+    return [
+        attachment[_trim:]
+        for attachment in glob('%s/%s.*.%s' % (source_dir, slug, extension))
+    ]
+
+
+def index_attachments(filenames):
+    """
+    Index the attachments among `filenames` by the slug and extension of
+    the sources they would attach to, as `find_attachments` would find
+    them, so the source directory is not searched again for every source.
+    """
+    index = {}
+    for filename in filenames:
+        _dir, _, _name = filename.rpartition('/')
+        _parts = _name.split('.')
+        if len(_parts) < 3 or _parts[-1] not in ('markdown', 'html'):
+            continue
+        # "a.b.body.html" matches both "a.*.html" and "a.b.*.html"
+        for _end in range(1, len(_parts) - 1):
+            slug = '.'.join(_parts[:_end])
+            if _dir:
+                slug = '%s/%s' % (_dir, slug)
+            index.setdefault((slug, _parts[-1]), []).append(filename)
+    return index
 
 
 class SourceBase:
+    # sites can have a great many sources, so they are kept compact
+    __slots__ = (
+        '_parent',
+        '_source',
+        '_slug',
+        '_config',
+        '_attachments',
+        '_markdown',
+        '_pending',
+        '_path_memo',
+    )
+
     @property
     def slug(self):
         return self._slug
@@ -20,6 +68,16 @@ class SourceBase:
     def path(self):
         # FIXME when _source_url is not set
         _path = self._parent._source_path
+
+        # remembered until the source path or any source changes
+        _key = (_path, _path.path, self._parent._sources_version)
+        _memo = getattr(self, '_path_memo', None)
+        if _memo is None or _memo[0] != _key:
+            _memo = (_key, self._resolve_path(_path))
+            self._path_memo = _memo
+        return _memo[1]
+
+    def _resolve_path(self, _path):
         _filter = {}
         for _arg in _path.arguments:
             try:
@@ -50,6 +108,7 @@ class SourceBase:
     def related(self, key):
         try:
             _filter = {}
+            self._convert_markdown(key)
             _filter[key] = self._config[key]
             return self._parent.sources.filter(
                     **_filter
@@ -60,42 +119,134 @@ class SourceBase:
             return []
 
     def _add_html_attachments(self):
-        pattern = '%s/%s.*.html' % (self._parent.source_dir, self.slug)
-        for attachment in glob(pattern):
+        _source_dir = self._parent.source_dir
+        for attachment in find_attachments(
+            _source_dir, self.slug, 'html', self._parent._attachment_index
+        ):
+            self._attachments.append(attachment)
             key = attachment.split('.')[-2]
-            with codecs.open(attachment, encoding='utf-8') as content:
-                if key in self._config and len(self._config[key]):
+            _filename = os.path.join(_source_dir, attachment)
+            with codecs.open(_filename, encoding='utf-8') as content:
+                _pending = self._pending is not None and key in self._pending
+                if _pending or key in self._config and len(self._config[key]):
                     warnings.warn(
                         '"%s" in %s overriden by HTML attachment.' % (
                             key, self.slug))
+                if self._markdown is not None:
+                    self._markdown.pop(key, None)
+                if _pending:
+                    self._pending.discard(key)
                 self._config[key] = content.read()
 
     def _add_markdown_attachments(self):
-        pattern = '%s/%s.*.markdown' % (self._parent.source_dir, self.slug)
-        for attachment in glob(pattern):
+        _source_dir = self._parent.source_dir
+        for attachment in find_attachments(
+            _source_dir, self.slug, 'markdown', self._parent._attachment_index
+        ):
+            self._attachments.append(attachment)
             key = attachment.split('.')[-2] + '_markdown'
-            with codecs.open(attachment, encoding='utf-8') as content:
+            _filename = os.path.join(_source_dir, attachment)
+            with codecs.open(_filename, encoding='utf-8') as content:
                 if key in self._config and len(self._config[key]):
                     warnings.warn(
                         '"%s" in %s overriden by Markdown attachment.' % (
                             key, self.slug))
                 self._config[key] = content.read()
 
-    def _convert_markdown(self):
-        add = {}
+    def _find_markdown(self):
+        """
+        Note the keys that will be converted from Markdown, which happens
+        the first time each is used rather than for every source up front.
+        """
+        self._markdown = None
+        self._pending = None
         for key in self._config:
             if key[-9:] == '_markdown':
-                dest = key[:-9]
-                add[dest] = markdown2.markdown(self._config[key])
+                dest = sys.intern(key[:-9])
                 if dest in self._config and len(self._config[dest]):
                     warnings.warn(
                         '"%s" in %s overriden by Markdown conversion.' % (
                             dest, self.slug))
-        self._config.update(add)
+                if self._markdown is None:
+                    self._markdown = {}
+                    self._pending = set()
+                self._markdown[dest] = key
+                self._pending.add(dest)
+
+        # the Markdown has to be converted before it can be dropped
+        if self._pending is not None and not self._parent.keep_markdown:
+            self._convert_markdown()
+
+    def _convert_markdown(self, dest=None):
+        """ Convert `dest`, or every key, from Markdown if still pending. """
+        if self._pending is None:
+            return
+        if dest is None:
+            dests = [_d for _d in self._markdown if _d in self._pending]
+        elif dest in self._pending:
+            dests = [dest]
+        else:
+            return
+        for dest in dests:
+            self._pending.discard(dest)
+            key = self._markdown[dest]
+            self._config[dest] = markdown2.markdown(self._config[key])
+            if not self._parent.keep_markdown:
+                del self._config[key]
+        if not self._pending:
+            self._pending = None
+
+    def _get_unconverted_config(self):
+        """
+        The configuration, with any key converted from Markdown left out
+        while the Markdown itself is kept, so it is the same whether or
+        not the conversion has happened yet.
+        """
+        if self._markdown is None:
+            return self._config
+        return {
+            key: value
+            for key, value in self._config.items()
+            if key not in self._markdown
+            or self._markdown[key] not in self._config
+        }
+
+    @classmethod
+    def _get_slots(cls):
+        _slots = []
+        for _class in cls.__mro__:
+            for _slot in getattr(_class, '__slots__', ()):
+                if _slot not in _slots:
+                    _slots.append(_slot)
+        return _slots
+
+    def _get_cached_state(self):
+        _state = {}
+        for _slot in self._get_slots():
+            if _slot in ('_parent', '_path_memo'):
+                continue
+            try:
+                _state[_slot] = object.__getattribute__(self, _slot)
+            except AttributeError:
+                pass
+        _state.update(getattr(self, '__dict__', {}))
+        return _state
+
+    @classmethod
+    def _from_cached_state(cls, parent, state):
+        _source = cls.__new__(cls)
+        _source._markdown = None
+        _source._pending = None
+        for _key, _value in state.items():
+            setattr(_source, _key, _value)
+        _source._parent = parent
+        return _source
 
     def __getattr__(self, key):
         if key == 'slug':
             return self.slug
+        if self._pending is not None and key in self._pending:
+            self._convert_markdown(key)
         if key in self._config:
             return self._config[key]
 
@@ -121,37 +272,62 @@ class SourceBase:
 
     def __iter__(self):
         _keys = list(self._config)
+        if self._pending is not None:
+            for _key in self._markdown:
+                if _key in self._pending and _key not in self._config:
+                    _keys.append(_key)
         _keys.append('slug')
         return iter(_keys)
 
+    def __contains__(self, key):
+        return (
+            key == 'slug'
+            or key in self._config
+            or (self._pending is not None and key in self._pending)
+        )
+
+    def get_config(self):
+        """ The configuration of the source, with all Markdown converted. """
+        self._convert_markdown()
+        return self._config
+
     class DoesNotExist(Exception):
         pass
 
 
 class SourceFile(SourceBase):
+    __slots__ = ('_timestamp',)
+
     def __init__(self, parent, filename):
         slug, _ = os.path.splitext(filename)
         self._source = filename
         self._slug = slug
         self._parent = parent
+        self._attachments = []
         self._config = self._read_configuration(filename)
         self._timestamp = os.stat(
                 os.path.join(self._parent.source_dir, filename)
             ).st_mtime
         self._add_markdown_attachments()
-        self._convert_markdown()
+        self._find_markdown()
         self._add_html_attachments()
 
+    @classmethod
+    def read_sources(cls, parent, filename):
+        return [cls(parent, filename)]
+
     def _read_configuration(self, filename):
         toml_file = '%s/%s' % (self._parent.source_dir, filename)
         with codecs.open(toml_file, encoding='utf-8') as configuration:
-            return toml.loads(configuration.read())
+            return loads_toml(configuration.read())
 
     def __repr__(self):
         return '<flourish.SourceFile object (%s)>' % self._source
 
 
 class MarkdownSourceFile(SourceFile):
+    __slots__ = ()
+
     def _read_configuration(self, filename):
         markdown_file = '%s/%s' % (self._parent.source_dir, filename)
         with codecs.open(markdown_file, encoding='utf-8') as configuration:
@@ -161,7 +337,7 @@ class MarkdownSourceFile(SourceFile):
             FM_SPLIT = re.compile('^%s{3}$' % _delim_char, re.MULTILINE)
             try:
                 _, _frontmatter, _body = FM_SPLIT.split(content, 2)
-                config = toml.loads(_frontmatter)
+                config = loads_toml(_frontmatter)
                 config['body_markdown'] = _body
             except ValueError:
                 raise RuntimeError(
@@ -177,12 +353,15 @@ class MarkdownSourceFile(SourceFile):
 
 
 class TomlSourceFile(SourceFile):
+    __slots__ = ()
+
     def __repr__(self):
         return '<flourish.TomlSourceFile object (%s)>' % self._source
 
 
 class JsonSourceFile(SourceFile):
-    ISO8601 = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}Z$')
+    __slots__ = ()
+    ISO8601 = ISO8601
 
     def _read_configuration(self, filename):
         _json_file = '%s/%s' % (self._parent.source_dir, filename)
@@ -190,10 +369,7 @@ class JsonSourceFile(SourceFile):
             _config = json.loads(_configuration.read())
 
         for _key, _value in _config.items():
-            if type(_value) is str and self.ISO8601.match(_value):
-                _config[_key] = datetime.strptime(
-                        _value, "%Y-%m-%dT%H:%M:%SZ"
-                    ).replace(tzinfo=timezone.utc)
+            _config[_key] = parse_timestamp(_value)
         return _config
 
     def __repr__(self):
@@ -201,44 +377,94 @@ class JsonSourceFile(SourceFile):
 
 
 class CsvRowSource(SourceBase):
-    ISO8601 = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}Z$')
+    __slots__ = ('_index', '_row')
+    ISO8601 = ISO8601
 
-    def __init__(self, parent, filename, index, row):
+    def __init__(self, parent, filename, index, row, arrays=None):
         self._parent = parent
         self._source = filename
         self._index = index
+        self._row = None
+        self._attachments = []
+        self._slug = self.row_slug(row['slug'])
+        self._read_row(row, arrays)
+        self._add_markdown_attachments()
+        self._find_markdown()
+        self._add_html_attachments()
+
+    @classmethod
+    def from_columns(cls, parent, filename, index, slug, columns, position):
+        """
+        The source for the row at `position` in `columns`, which is only
+        made into its configuration when first used. The row must have no
+        attachments and no Markdown to convert, which would otherwise have
+        to be found (and warned about) as the file is read.
+        """
+        _source = cls.__new__(cls)
+        _source._parent = parent
+        _source._source = filename
+        _source._index = index
+        _source._row = (columns, position)
+        _source._attachments = []
+        _source._markdown = None
+        _source._pending = None
+        _source._slug = cls.row_slug(slug)
+        return _source
+
+    @staticmethod
+    def row_slug(slug):
+        if slug.startswith('/'):
+            slug = slug[1:]
+        if slug.endswith('/'):
+            slug += 'index'
+        return slug
+
+    def _read_row(self, row, arrays=None):
         self._config = row
-        if row['slug'].startswith('/'):
-            self._slug = row['slug'][1:]
-        else:
-            self._slug = row['slug']
-        if self._slug.endswith('/'):
-            self._slug += 'index'
+        if arrays is None:
+            arrays = self.find_arrays(row)
 
+        # split string arrays
         _add = {}
+        for _key, _akey in arrays:
+            _value = row[_key]
+            if _value.find(',') > -1:
+                _add[_akey] = _value.split(',')
+            else:
+                _add[_akey] = _value.split(':')
+
+        # convert timestamps
         for _key, _value in row.items():
-            # convert timestamps
-            if type(_value) is str and self.ISO8601.match(_value):
-                row[_key] = datetime.strptime(
-                        _value, "%Y-%m-%dT%H:%M:%SZ"
-                    ).replace(tzinfo=timezone.utc)
-            # split string arrays
-            if _key.endswith('[]'):
-                _akey = _key[:-2]
-                if _value.find(',') > -1:
-                    _add[_akey] = _value.split(',')
-                else:
-                    _add[_akey] = _value.split(':')
+            row[_key] = parse_timestamp(_value)
         self._config.update(_add)
 
         # clean up unwanted keys from the original CSV
         del (row['slug'])
-        for _key in _add:
-            del (row['%s[]' % _key])
+        for _key, _ in arrays:
+            del (row[_key])
 
-        self._add_markdown_attachments()
-        self._convert_markdown()
-        self._add_html_attachments()
+    def __getattr__(self, key):
+        if key == '_config':
+            # not yet read from the columns of the file
+            columns, position = self._row
+            self._row = None
+            self._read_row(columns.get_row(position), columns.arrays)
+            return self._config
+        return super().__getattr__(key)
+
+    @staticmethod
+    def find_arrays(keys):
+        """
+        The keys of the columns holding string arrays (eg. "tag[]"), each
+        with the key it is split into. Every row of a file has the same
+        columns, so this is only worked out once per file.
+        """
+        return [
+            # shared by every row, rather than a new string for each
+            (_key, sys.intern(_key[:-2]))
+            for _key in keys
+            if _key.endswith('[]')
+        ]
 
     def __repr__(self):
         return '<flourish.CsvRowSource object (%s, row %d)>' % (
@@ -247,11 +473,66 @@ class CsvRowSource(SourceBase):
             )
 
 
+class CsvColumns:
+    """
+    The rows of a CSV file stored by column, rather than as a dict for
+    every row, until each is first used.
+    """
+
+    def __init__(self, fieldnames):
+        self.fieldnames = fieldnames
+        self.columns = [[] for _ in fieldnames]
+        self.arrays = CsvRowSource.find_arrays(fieldnames)
+        self.count = 0
+
+    def has_markdown(self):
+        """ True if the rows would have any key to convert from Markdown. """
+        _arrays = dict(self.arrays)
+        for _key in self.fieldnames:
+            _key = _arrays.get(_key, _key)
+            if _key != 'slug' and _key.endswith('_markdown'):
+                return True
+        return False
+
+    def append(self, values):
+        """
+        Store a row with no more values than there are columns, returning
+        its position.
+        """
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        for column in self.columns[len(values):]:
+            column.append(None)
+        self.count += 1
+        return self.count - 1
+
+    def get_row(self, position):
+        return self.make_row(
+            self.fieldnames,
+            [column[position] for column in self.columns],
+        )
+
+    @staticmethod
+    def make_row(fieldnames, values):
+        """ The row as `csv.DictReader` would give it. """
+        row = dict(zip(fieldnames, values))
+        if len(fieldnames) < len(values):
+            row[None] = values[len(fieldnames):]
+        else:
+            for key in fieldnames[len(values):]:
+                row[key] = None
+        return row
+
+
 class MultipleSourcesFile:
     def __init__(self, parent, filename):
         self._parent = parent
         self._sources = self._read_file(filename)
 
+    @classmethod
+    def read_sources(cls, parent, filename):
+        return cls(parent, filename).get_sources()
+
     def get_sources(self):
         return self._sources
 
@@ -261,24 +542,63 @@ class CsvSourceFile(MultipleSourcesFile):
 
     def _read_file(self, filename):
         _sources = []
-        _source = '%s/%s' % (self._parent.source_dir, filename)
+        _source_dir = self._parent.source_dir
+        _index = self._parent._attachment_index
+        _source = '%s/%s' % (_source_dir, filename)
         with open(_source) as handle:
-            reader = csv.DictReader(handle)
-            for line, row in enumerate(reader):
-                if 'slug' not in row:
+            reader = csv.reader(handle)
+            fieldnames = next(reader, None)
+            if fieldnames is None:
+                return _sources
+            columns = CsvColumns(fieldnames)
+            # rows are kept by column until used, unless there is more
+            # to do (and warn about) as they are read
+            eager = _index is None or columns.has_markdown()
+            if 'slug' in fieldnames:
+                _slug_column = len(fieldnames) - 1 - fieldnames[::-1].index(
+                    'slug')
+            line = -1
+            for values in reader:
+                if not values:
+                    # skipped, as csv.DictReader does
+                    continue
+                line += 1
+                if 'slug' not in fieldnames:
                     warnings.warn('"%s" has no column "slug"' % filename)
                     break
-                else:
-                    if not self.VALID_SLUG.match(row['slug']):
-                        warnings.warn(
-                            '"%s" row %d, has an invalid slug "%s"' % (
-                                filename,
-                                line,
-                                row['slug'],
-                            )
+                slug = None
+                if _slug_column < len(values):
+                    slug = values[_slug_column]
+                if not self.VALID_SLUG.match(slug):
+                    warnings.warn(
+                        '"%s" row %d, has an invalid slug "%s"' % (
+                            filename,
+                            line,
+                            slug,
                         )
-                        continue
+                    )
+                    continue
+                if (
+                    eager
+                    or len(values) > len(fieldnames)
+                    or self._has_attachments(slug, _index)
+                ):
+                    row = columns.make_row(fieldnames, values)
                     _sources.append(
-                        CsvRowSource(self._parent, filename, line, row)
+                        CsvRowSource(
+                            self._parent, filename, line, row, columns.arrays)
+                    )
+                else:
+                    _sources.append(
+                        CsvRowSource.from_columns(
+                            self._parent, filename, line, slug,
+                            columns, columns.append(values))
                     )
         return _sources
+
+    def _has_attachments(self, slug, index):
+        slug = CsvRowSource.row_slug(slug)
+        return (
+            (slug, 'markdown') in index
+            or (slug, 'html') in index
+        )
@@ -1,5 +1,5 @@
-from collections import defaultdict
 from datetime import date, datetime, timezone
+import heapq
 from operator import attrgetter
 import warnings
 
@@ -10,20 +10,48 @@ class SourceList:
         'ordering',
         'slice',
         'future',
+        'legacy_ordering',
     ]
 
-    def __init__(self, sources, **kwargs):
+    def __init__(self, sources, parent=None, **kwargs):
         self.sources = sources
+        self.parent = parent
         self.ordering = []
         self.filters = []
         self.slice = None
         self.future = True
+        self.legacy_ordering = False
+        self._filter_tests = None
+        self._now = None
+        self._next_published = None
+        self._evaluated = None
+        self._date_index = None
 
         for arg in self.ARGS:
             if arg in kwargs:
                 if kwargs[arg] is not None:
                     setattr(self, arg, kwargs[arg])
 
+    def __getstate__(self):
+        # the query, without the Flourish object it is run against
+        state = {'sources': self.sources}
+        for arg in ('ordering', 'filters', 'slice', 'future'):
+            state[arg] = getattr(self, arg)
+        # left out unless set, so the blueprint context is unchanged
+        if self.legacy_ordering:
+            state['legacy_ordering'] = self.legacy_ordering
+        return state
+
+    def __setstate__(self, state):
+        self.legacy_ordering = False
+        self.__dict__.update(state)
+        self.parent = None
+        self._filter_tests = None
+        self._now = None
+        self._next_published = None
+        self._evaluated = None
+        self._date_index = None
+
     def all(self):
         """ Get all source documents. """
         return self
@@ -40,10 +68,7 @@ class SourceList:
     def exclude(self, **kwargs):
         clone = self.clone()
         for key, value in kwargs.items():
-            if '__' in key:
-                field, operator = key.split('__', 2)
-            else:
-                field, operator = key, 'eq'
+            field, operator = split_filter(key)
             new_operator = INVERSE_OPERATORS.get(operator)
             key = '%s__%s' % (field, new_operator)
             clone.filters.append((key, value))
@@ -64,107 +89,214 @@ class SourceList:
                 kwargs.setdefault(arg, value[:])
             else:
                 kwargs.setdefault(arg, value)
-        return type(self)(self.sources, **kwargs)
+        return type(self)(self.sources, parent=self.parent, **kwargs)
 
     def get_filtered_sources(self):
-        sources = []
-        for source in self.sources:
-            add = True
-            if 'published' in source and not self.future:
-                if source['published'] > datetime.now(tz=timezone.utc):
-                    add = False
-            if len(self.filters):
-                for filter in self.filters:
-                    if not add:
-                        # already filtered out by a previous filter
-                        continue
-                    if '__' in filter[0]:
-                        field, operator = filter[0].split('__', 2)
-                    else:
-                        field, operator = filter[0], 'eq'
-                    operation = OPERATORS.get(operator)
-                    if operation is None:
-                        # FIXME write test and raise more useful error
-                        raise RuntimeError
-                    is_date_filter = (
-                        field in ['year', 'month', 'day'] and
-                        'published' in source and
-                        type(source['published'] is datetime)
-                    )
-
-                    try:
-                        if is_date_filter:
-                            test = '%02d' % getattr(
-                                source['published'], field)
-                        else:
-                            test = getattr(source, field)
-                    except AttributeError:
-                        test = None
-
-                    result = operation(test, filter[1])
-                    if not result:
-                        add = False
-            if add:
-                sources.append(source)
-        return sources
+        sources = self.sources
+        tests = self.get_filter_tests()
+        index = self.get_index()
+        if index is not None and len(self.filters):
+            indexed = index.filter(self.filters)
+            if indexed is not None:
+                sources, remaining = indexed
+                tests = [tests[_pos] for _pos in remaining]
+        if not self.future:
+            self._now = datetime.now(tz=timezone.utc)
+            self._next_published = None
+            tests = [self._not_in_future] + tests
+
+        if not tests:
+            return list(sources)
+
+        def matches(source):
+            for test in tests:
+                if not test(source):
+                    return False
+            return True
+
+        return [source for source in sources if matches(source)]
+
+    def get_filter_tests(self):
+        """
+        The filters compiled into one test function each, which is only
+        done the first time the list is used.
+        """
+        if self._filter_tests is None:
+            self._filter_tests = [
+                compile_filter(key, value) for key, value in self.filters
+            ]
+        return self._filter_tests
+
+    def _not_in_future(self, source):
+        if 'published' not in source or not source['published'] > self._now:
+            return True
+        # the sources need evaluating again once this is published
+        if (
+            self._next_published is None
+            or source['published'] < self._next_published
+        ):
+            self._next_published = source['published']
+        return False
+
+    def has_expired(self):
+        """
+        True if a source left out for being in the future has since been
+        published.
+        """
+        return (
+            self._next_published is not None
+            and datetime.now(tz=timezone.utc) >= self._next_published
+        )
+
+    def get_index(self):
+        """
+        The parent's index of sources, if it can be used for this list.
+        """
+        if self.parent is None:
+            return None
+        if self.sources is not self.parent._source_files:
+            return None
+        return self.parent.get_source_index()
 
     @property
     def publication_dates(self):
-        def recursively_default_dict():
-            return defaultdict(recursively_default_dict)
+        return self.get_date_index().publication_dates()
+
+    def get_date_index(self, key='published'):
+        """
+        The dates in `key` of the sources, counted by year, month and day.
+        This is remembered for as long as the sources are.
+        """
+        sources = self.get_sources()
+        if (
+            self._date_index is None
+            or self._date_index[0] is not sources
+            or self._date_index[1] != key
+        ):
+            self._date_index = (sources, key, DateIndex(sources, key))
+        return self._date_index[2]
+
+    def get_sources(self):
+        """
+        The filtered, ordered and sliced sources. These are remembered
+        until the parent's sources change (or a future source is published),
+        so counting, indexing and iterating over the list again does not
+        repeat the work.
+        """
+        if self.parent is None:
+            sources = self.evaluate()
+        else:
+            version = self.parent._sources_version
+            if (
+                self._evaluated is None
+                or self._evaluated[0] != version
+                or self.has_expired()
+            ):
+                self._evaluated = (version, self.evaluate())
+            sources = self._evaluated[1]
+            if self.parent._recorder is not None:
+                self.parent._recorder.record_query(self, sources)
+        return sources
 
-        _captured = recursively_default_dict()
-        for _source in self.all():
-            try:
-                _date = getattr(_source, 'published')
-                _captured[_date.year][_date.month][_date.day] = 1
-            except AttributeError:
-                pass
+    def evaluate(self):
+        sources = self.get_filtered_sources()
+        limit = self.get_limit()
+        if self.ordering and limit is not None and limit < len(sources):
+            sources = self.select_ordered(sources, limit)
+        else:
+            sources = self.order(sources)
 
-        _dates = []
-        for _year in sorted(_captured):
-            _months = []
-            for _month in sorted(_captured[_year]):
-                _days = []
-                for _day in sorted(_captured[_year][_month]):
-                    _days.append(date(_year, _month, _day))
-                _months.append({
-                    'month': date(_year, _month, 1),
-                    'days': _days
-                })
-            _dates.append({'year': date(_year, 1, 1), 'months': _months})
-        return _dates
+        if self.slice is not None:
+            sources = sources.__getitem__(self.slice)
+        return sources
 
-    def __iter__(self):
-        sources = self.get_filtered_sources()
+    def order(self, sources):
+        sort = self.get_sort(sources)
+        if sort is None:
+            return list(sources)
+        key, reverse = sort
+        positions = sorted(range(len(sources)), key=key, reverse=reverse)
+        return [sources[_pos] for _pos in positions]
+
+    def get_sort(self, sources):
+        """
+        A function returning the sort key for each position in `sources`,
+        and whether to sort in reverse, or None if there is nothing to
+        sort by. The value of each ordering is only looked up once for
+        each source.
+        """
+        keys = []
         for order in self.ordering:
-            if order.startswith('-'):
-                rev = True
-                attr = order[1:]
-            else:
-                rev = False
-                attr = order
+            reverse = order.startswith('-')
+            attr = order[1:] if reverse else order
+            getter = attrgetter(attr)
             try:
-                sources = sorted(
-                    sources,
-                    key=attrgetter(attr),
-                    reverse=rev
-                )
+                values = [getter(source) for source in sources]
             except AttributeError:
                 warnings.warn(
                     'sorting sources by "%s" failed: '
                     'not all sources have that attribute' % order
                 )
+                continue
+            keys.append((reverse, values))
+        if not keys:
+            return None
+        if self.legacy_ordering:
+            # one stable sort after another, which makes the last
+            # ordering the most significant
+            keys.reverse()
+
+        # sorting in reverse keeps equal sources in their original order,
+        # so is only possible when every ordering is reversed
+        reverse = all(_reverse for _reverse, _ in keys)
+        if not reverse:
+            keys = [
+                (_reverse, [_Descending(_v) for _v in values])
+                if _reverse else (_reverse, values)
+                for _reverse, values in keys
+            ]
+        columns = [values for _, values in keys]
+        if len(columns) == 1:
+            return columns[0].__getitem__, reverse
+        rows = list(zip(*columns))
+        return rows.__getitem__, reverse
+
+    def get_limit(self):
+        """
+        How many sources from the start of the ordered list are needed to
+        take the slice, or None if the slice could need them all.
+        """
+        if self.slice is None or self.slice.stop is None:
+            return None
+        if self.slice.step not in (None, 1):
+            return None
+        if self.slice.stop < 0:
+            return None
+        if self.slice.start is not None and self.slice.start < 0:
+            return None
+        return self.slice.stop
+
+    def select_ordered(self, sources, limit):
+        """
+        The first `limit` sources of `order(sources)`, found without
+        sorting every source.
+        """
+        sort = self.get_sort(sources)
+        if sort is None:
+            return list(sources)[:limit]
+        key, reverse = sort
+        if reverse:
+            _select = heapq.nlargest
+        else:
+            _select = heapq.nsmallest
+        positions = _select(limit, range(len(sources)), key=key)
+        return [sources[_pos] for _pos in positions]
 
-        if self.slice is not None:
-            sources = sources.__getitem__(self.slice)
-        return iter(sources)
+    def __iter__(self):
+        return iter(self.get_sources())
 
     def __len__(self):
-        _sources = 0
-        for source in self:
-            _sources += 1
-        return _sources
+        return len(self.get_sources())
 
     def __getitem__(self, item):
         if isinstance(item, slice):
@@ -175,16 +307,117 @@ class SourceList:
             if stop and stop < 0:
                 stop = self.count() + stop
             return self.clone(slice=slice(start, stop))
+        sources = self.get_sources()
         if item < 0:
-            item = self.count() + item
-        iterator = iter(self)
-        try:
-            for i in range(0, item+1):
-                obj = next(iterator)
-        except StopIteration:
+            item = len(sources) + item
+        if not 0 <= item < len(sources):
             raise IndexError(item)
-        return obj
-        return None
+        return sources[item]
+
+
+class DateIndex:
+    """
+    The number of sources on each day of the dates in `key`, by year, month
+    and day, so that calendars and ranges of dates can be worked out
+    without looking at every source again.
+    """
+    def __init__(self, sources, key='published'):
+        self.counts = {}
+        for source in sources:
+            try:
+                _date = getattr(source, key)
+                _months = self.counts.setdefault(_date.year, {})
+                _days = _months.setdefault(_date.month, {})
+                _days[_date.day] = _days.get(_date.day, 0) + 1
+            except AttributeError:
+                pass
+
+    def get_years(self):
+        return sorted(self.counts)
+
+    def publication_dates(self, year=None, month=None):
+        """
+        Each year, with each month and the days within it that have
+        sources, optionally only for one `year` and `month`.
+        """
+        if year is None:
+            years = self.get_years()
+        else:
+            years = [year] if year in self.counts else []
+
+        _dates = []
+        for _year in years:
+            _counts = self.counts[_year]
+            if month is None:
+                months = sorted(_counts)
+            else:
+                months = [month] if month in _counts else []
+            _months = []
+            for _month in months:
+                _months.append({
+                    'month': date(_year, _month, 1),
+                    'days': [
+                        date(_year, _month, _day)
+                        for _day in sorted(_counts[_month])
+                    ],
+                })
+            _dates.append({'year': date(_year, 1, 1), 'months': _months})
+        return _dates
+
+
+class _Descending:
+    """ A value that sorts in the opposite direction. """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def split_filter(key):
+    if '__' in key:
+        field, operator = key.split('__', 2)
+    else:
+        field, operator = key, 'eq'
+    return field, operator
+
+
+def field_accessor(field):
+    """ A function returning the value of `field` that a filter tests. """
+    if field in ('year', 'month', 'day'):
+        def accessor(source):
+            try:
+                if 'published' in source:
+                    return '%02d' % getattr(source['published'], field)
+                return getattr(source, field)
+            except AttributeError:
+                return None
+    else:
+        def accessor(source):
+            try:
+                return getattr(source, field)
+            except AttributeError:
+                return None
+    return accessor
+
+
+def compile_filter(key, value):
+    """ Turn one filter into a function that tests a source. """
+    field, operator = split_filter(key)
+    operation = OPERATORS.get(operator)
+    if operation is None:
+        # FIXME write test and raise more useful error
+        raise RuntimeError
+    accessor = field_accessor(field)
+
+    def test(source):
+        return operation(accessor(source), value)
+    return test
 
 
 def _equal_or_inside(value, test):
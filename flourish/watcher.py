@@ -0,0 +1,89 @@
+import os
+import threading
+
+
+class SourceWatcher:
+    """
+    Polls a directory in a background thread, noting when any file in it
+    is added, removed or changed, so that finding out whether the sources
+    need scanning again costs nothing at the time they are needed.
+
+    A directory whose modification time has not changed still has the same
+    entries, so it is not listed again; only its files are checked.
+    """
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self._listings = {}
+        self._snapshot = self.scan()
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def has_changed(self):
+        """ True if anything has changed since the last time of asking. """
+        if self._changed.is_set():
+            self._changed.clear()
+            return True
+        return False
+
+    def poll(self):
+        snapshot = self.scan()
+        if snapshot != self._snapshot:
+            self._snapshot = snapshot
+            self._changed.set()
+
+    def scan(self):
+        """ The modification time and size of every file, by path. """
+        snapshot = {}
+        listings = {}
+        pending = [self.directory]
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except FileNotFoundError:
+                continue
+            listing = self._listings.get(directory)
+            if listing is None or listing[0] != mtime:
+                listing = (mtime,) + self._list(directory)
+            listings[directory] = listing
+            _, files, subdirs = listing
+            for _file in files:
+                try:
+                    stat = os.stat(_file)
+                except FileNotFoundError:
+                    continue
+                snapshot[_file] = (stat.st_mtime, stat.st_size)
+            pending.extend(subdirs)
+        self._listings = listings
+        return snapshot
+
+    def _list(self, directory):
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    else:
+                        files.append(entry.path)
+        except FileNotFoundError:
+            pass
+        return files, subdirs
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
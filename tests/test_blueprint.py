@@ -1,3 +1,4 @@
+import json
 from textwrap import dedent
 
 import warnings
@@ -350,3 +351,22 @@ class TestBlueprint:
             {
               "copyright_year_range": "2015\\u20132016"
             }""")
+
+    def test_blueprint_leaves_out_internal_state(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            flourish = Flourish(
+                source_dir='tests/source',
+                templates_dir='tests/templates',
+            )
+
+        blueprint = flourish.path_blueprint('/basic-page')
+        parent = json.loads(blueprint['debug_page_context'])['page']['_parent']
+        assert 'source_dir' in parent
+        for key in ('_cache', '_source_index', '_read_files', 'writer'):
+            assert key not in parent
+        paths = list(parent['_paths'].values()) + [parent['_source_path']]
+        for path in paths:
+            assert '_valid_filters' not in path
+            assert '_routes' not in path
+        assert '_path_memo' not in blueprint['debug_page_context']
@@ -1,9 +1,14 @@
+import copy
 from datetime import date, datetime, timezone
+import os
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
 
 import pytest
 import warnings
 
 from flourish import Flourish, JsonSourceFile, SourceList, TomlSourceFile
+from flourish.source import CsvRowSource
 
 
 class TestFlourishNoArgs:
@@ -218,8 +223,9 @@ class TestFlourish:
                     'series/part-two',
                     'series/index',
                 ] == [source.slug for source in sources]
-            # twice, once for `len(sources)`, once for `for source in sources`
-            assert len(record) == 2
+            # once, as `for source in sources` reuses the sources
+            # already sorted for `len(sources)`
+            assert len(record) == 1
             assert (
                 str(record[0].message) ==
                 'sorting sources by "-updated" failed: '
@@ -228,7 +234,7 @@ class TestFlourish:
 
     def test_order_by_multiple_keys(self):
         sources = self.flourish.sources.filter(published__set='')
-        sorted_sources = sources.order_by('title', '-published')
+        sorted_sources = sources.order_by('-published', 'title')
         assert type(sorted_sources) is SourceList
         assert len(sorted_sources) == 8
         # thing-one and thing-two come out in reverse order compared to
@@ -246,6 +252,69 @@ class TestFlourish:
                 'basic-page',
             ] == [source.slug for source in sorted_sources]
 
+    @pytest.mark.parametrize('ordering', [
+        ('published',),
+        ('-published',),
+        ('title', '-published'),
+        ('-title', '-published'),
+        ('slug', 'published'),
+        ('-slug', 'title', '-published'),
+        ('-published', 'title'),
+    ])
+    def test_ordering_with_limit_matches_full_sort(self, ordering):
+        sources = self.flourish.sources.filter(published__set='')
+        sources = sources.order_by(*ordering)
+        everything = [source.slug for source in sources]
+        for limit in range(0, len(everything) + 2):
+            limited = sources[0:limit]
+            assert limited.get_limit() == limit
+            assert everything[:limit] == [source.slug for source in limited]
+            assert everything[1:limit] == [
+                source.slug for source in sources[1:limit]
+            ]
+
+    def test_ordering_with_limit_skips_missing_key(self):
+        sources = self.flourish.sources.all().order_by('-updated', 'title')
+        with pytest.warns(UserWarning) as record:
+            assert [
+                    'series/index',
+                    'basic-page',
+                    'nothing',
+                ] == [source.slug for source in sources[0:3]]
+        assert len(record) == 1
+        assert (
+            str(record[0].message) ==
+            'sorting sources by "-updated" failed: '
+            'not all sources have that attribute'
+        )
+
+    def test_order_by_first_key_is_most_significant(self):
+        sources = self.flourish.sources.filter(published__set='')
+        sorted_sources = sources.order_by('title', '-published')
+        assert [
+                'series/index',
+                'basic-page',
+                'series/part-one',
+                'series/part-three',
+                'series/part-two',
+                'markdown-page',
+                'thing-two',
+                'thing-one',
+            ] == [source.slug for source in sorted_sources]
+
+    def test_legacy_ordering_makes_last_key_most_significant(self):
+        sources = self.flourish.sources.filter(published__set='')
+        legacy = sources.order_by('title', '-published').clone(
+            legacy_ordering=True)
+        modern = sources.order_by('-published', 'title')
+        assert legacy.legacy_ordering
+        assert [source.slug for source in modern] == [
+            source.slug for source in legacy
+        ]
+        assert [source.slug for source in modern[0:3]] == [
+            source.slug for source in legacy[0:3]
+        ]
+
     def test_filter_equal_to(self):
         on = datetime(2016, 6, 4, 12, 30, 0, tzinfo=timezone.utc)
         sources = self.flourish.sources.filter(published=on)
@@ -950,6 +1019,61 @@ class TestFlourish:
                     'thing-two',
                 ] == [source.slug for source in sources]
 
+    def test_filters_are_compiled_once(self):
+        sources = self.flourish.sources.filter(tag__contains='one')
+        assert [
+                'series/part-one',
+                'thing-one',
+            ] == sorted(source.slug for source in sources)
+        tests = sources.get_filter_tests()
+        assert len(tests) == 1
+        assert len(sources) == 2
+        assert sources.get_filter_tests() is tests
+
+        # a clone compiles its own filters
+        clone = sources.exclude(series__set='')
+        assert clone.get_filter_tests() is not tests
+        assert ['thing-one'] == [source.slug for source in clone]
+
+    def test_copied_list_compiles_its_filters_again(self):
+        sources = self.flourish.sources.filter(tag__contains='one')
+        sources = sources.order_by('title')
+        sources.legacy_ordering = True
+        slugs = [source.slug for source in sources]
+
+        copied = copy.copy(sources)
+        assert copied._filter_tests is None
+        assert copied._evaluated is None
+        assert copied.legacy_ordering
+        assert slugs == [source.slug for source in copied]
+
+    def test_filter_with_unknown_operator_raises(self):
+        sources = self.flourish.sources.filter(title__like='Thing')
+        with pytest.raises(RuntimeError):
+            list(sources)
+
+    def test_sources_are_evaluated_once(self, monkeypatch):
+        sources = self.flourish.sources.filter(published__set='')
+        sources = sources.order_by('-published')
+        evaluated = []
+        evaluate = sources.evaluate
+
+        def counting_evaluate():
+            evaluated.append(True)
+            return evaluate()
+        monkeypatch.setattr(sources, 'evaluate', counting_evaluate)
+
+        assert len(sources) == 8
+        assert sources[0].slug == 'series/part-three'
+        assert sources[-1].slug == 'basic-page'
+        assert len(list(sources)) == 8
+        assert len(evaluated) == 1
+
+        with pytest.raises(IndexError):
+            sources[8]
+        with pytest.raises(IndexError):
+            sources[-9]
+
     def test_related_key_lookup(self):
         source = self.flourish.get('thing-one')
         related = source.related('line')
@@ -1017,6 +1141,17 @@ class TestFlourish:
         # ensure still unfiltered
         assert all_dates == self.flourish.publication_dates
 
+        # answered from one index of the dates
+        index = self.flourish.get_date_index()
+        assert index is self.flourish.get_date_index()
+        assert [all_dates[0]] == index.publication_dates(year=2015)
+        assert [{
+            'year': date(2016, 1, 1),
+            'months': [all_dates[1]['months'][1]],
+        }] == index.publication_dates(year=2016, month=6)
+        assert [] == index.publication_dates(year=2017)
+        assert index.counts[2016][6] == {4: 5, 6: 1}
+
     def test_redirects(self):
         assert self.flourish.redirects == {
             '/index.php': '/',
@@ -1024,6 +1159,108 @@ class TestFlourish:
         }
 
 
+class TestFlourishLegacyOrdering:
+    def test_legacy_ordering_argument(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish = Flourish('tests/source', legacy_ordering=True)
+        sources = flourish.sources.filter(published__set='')
+        assert sources.legacy_ordering
+        assert [
+                'series/part-three',
+                'thing-two',
+                'thing-one',
+                'series/part-two',
+                'series/part-one',
+                'series/index',
+                'markdown-page',
+                'basic-page',
+            ] == [
+                source.slug
+                for source in sources.order_by('title', '-published')
+            ]
+
+    def test_legacy_ordering_from_site_config(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish = Flourish('tests/source')
+        assert not flourish.sources.legacy_ordering
+        flourish._site_config['legacy_ordering'] = True
+        assert flourish.sources.legacy_ordering
+        flourish.legacy_ordering = False
+        assert not flourish.sources.legacy_ordering
+
+
+class TestFlourishRescan:
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.source_dir = os.path.join(self.tempdir, 'source')
+        copytree('tests/source', self.source_dir)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish = Flourish(self.source_dir)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def test_sources_evaluated_again_after_rescan(self):
+        sources = self.flourish.sources.filter(page_type='post')
+        assert len(sources) == 5
+
+        with open(os.path.join(self.source_dir, 'new.toml'), 'w') as handle:
+            handle.write('title = "New"\npage_type = "post"\n')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish._rescan_sources()
+        assert len(sources) == 6
+        assert 'new' in [source.slug for source in sources]
+
+        os.remove(os.path.join(self.source_dir, 'new.toml'))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish._rescan_sources()
+        assert len(sources) == 5
+
+    def test_unchanged_sources_are_not_a_change(self):
+        version = self.flourish._sources_version
+        sources = list(self.flourish.sources)
+        self.flourish._rescan_sources()
+        self.flourish._rescan_sources()
+        assert self.flourish._sources_version == version
+        assert list(self.flourish.sources) == sources
+
+    def test_changed_source_keeps_order_and_overrides(self):
+        slugs = [source.slug for source in self.flourish.sources]
+        filename = os.path.join(self.source_dir, 'series/part-three.toml')
+        os.utime(filename, (0, 0))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish._rescan_sources()
+        assert [source.slug for source in self.flourish.sources] == slugs
+        # the row in series.csv still overrides the TOML source
+        assert type(self.flourish.get('series/part-three')) is CsvRowSource
+
+    def test_changed_attachments_are_read_again(self):
+        version = self.flourish._sources_version
+        attachment = os.path.join(self.source_dir, 'thing-one.body.html')
+        with open(attachment, 'w') as handle:
+            handle.write('<p>Changed.</p>\n')
+        self.flourish._rescan_sources()
+        assert self.flourish.get('thing-one').body == '<p>Changed.</p>\n'
+        assert self.flourish._sources_version == version + 1
+
+        attachment = os.path.join(self.source_dir, 'basic-page.extra.html')
+        with open(attachment, 'w') as handle:
+            handle.write('<p>Extra.</p>\n')
+        self.flourish._rescan_sources()
+        assert self.flourish.get('basic-page').extra == '<p>Extra.</p>\n'
+
+        os.remove(attachment)
+        self.flourish._rescan_sources()
+        assert 'extra' not in self.flourish.get('basic-page')
+        assert self.flourish._sources_version == version + 3
+
+
 class TestFlourishFuture:
     @classmethod
     def setup_class(cls):
@@ -1052,6 +1289,18 @@ class TestFlourishFuture:
                 'nineteenth-century',
             ] == [source.slug for source in published]
 
+    def test_future_sources_appear_once_published(self, monkeypatch):
+        sources = SourceList(
+            self.flourish._source_files, parent=self.flourish, future=False)
+        assert len(sources) == 3
+
+        class Later(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime(2151, 1, 1, tzinfo=tz)
+        monkeypatch.setattr('flourish.sourcelist.datetime', Later)
+        assert len(sources) == 4
+
     def test_exclude_future(self):
         sources = self.flourish.sources.exclude_future()
         assert type(sources) is SourceList
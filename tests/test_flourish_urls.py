@@ -1,4 +1,5 @@
 from flourish import Flourish
+import flourish.generators.mixins
 from flourish.generators.base import SourceGenerator
 from flourish.source import SourceFile
 
@@ -125,6 +126,68 @@ class TestFlourishPaths:
         assert sources.filter(**_filters[2]).count() == 5   # 2016/06/04
         assert sources.filter(**_filters[3]).count() == 1   # 2016/06/06
 
+    @pytest.mark.parametrize('tokens', [
+        ['tag', 'year', 'slug'],
+        ['year', 'month', 'tag'],
+        ['page_type', 'day'],
+        ['series', 'tag'],
+    ])
+    def test_valid_filters_match_sources(self, tokens):
+        _filters = self.flourish.get_valid_filters_for_tokens(tokens)
+        assert _filters == sorted(
+            _filters, key=lambda _f: [_f[_t] for _t in tokens])
+        for _filter in _filters:
+            assert list(_filter) == tokens
+            assert self.flourish.sources.filter(**_filter).count() > 0
+
+        # every combination of values a source has is found
+        def values(source, token):
+            if token in ('year', 'month', 'day') and 'published' in source:
+                return ['%02d' % getattr(source['published'], token)]
+            if token not in source:
+                return []
+            if type(source[token]) is list:
+                return source[token]
+            return [source[token]]
+        for source in self.flourish.sources:
+            combinations = [{}]
+            for _token in tokens:
+                combinations = [
+                    dict(_c, **{_token: _v})
+                    for _c in combinations
+                    for _v in values(source, _token)
+                ]
+            for combination in combinations:
+                assert combination in _filters
+
+    def test_valid_filters_are_remembered(self, monkeypatch):
+        generator = self.flourish._paths['tag-post-detail']
+        _filters = self.flourish.all_valid_filters_for_path('tag-post-detail')
+
+        def not_expected(*args, **kwargs):
+            pytest.fail('valid filters should have been remembered')
+        monkeypatch.setattr(
+            self.flourish, 'get_valid_filters_for_tokens', not_expected)
+        assert generator.all_valid_filters() == _filters
+        assert generator.can_generate('/tags/series/series/part-one') == [
+            {'tag': 'series', 'slug': 'series/part-one'},
+        ]
+
+        # until the sources change
+        monkeypatch.undo()
+        calls = []
+        original = self.flourish.get_valid_filters_for_tokens
+
+        def counting(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+        monkeypatch.setattr(
+            self.flourish, 'get_valid_filters_for_tokens', counting)
+        self.flourish._sources_changed()
+        assert generator.all_valid_filters() == _filters
+        assert generator.all_valid_filters() == _filters
+        assert len(calls) == 1
+
     def test_no_such_keyword_has_no_filters(self):
         assert self.flourish.all_valid_filters_for_path('no-such-keyword') \
                 == []
@@ -177,6 +240,58 @@ class TestFlourishPaths:
         ]
         assert expected == self.flourish.get_handler_for_path('/2016?')
 
+    def test_lookup_path_handler_for_index_slug(self):
+        assert [
+            ('source', {'slug': 'series/index'}),
+        ] == self.flourish.get_handler_for_path('/series/')
+
+    def test_lookup_path_handler_uses_routes(self, monkeypatch):
+        self.flourish.get_handler_for_path('/tags/first/')
+        for generator in self.flourish._paths.values():
+            def not_expected(**kwargs):
+                pytest.fail('paths should not be resolved again')
+            monkeypatch.setattr(generator, 'resolve', not_expected)
+
+        assert [
+            ('tags-tag-page', {'tag': 'first'}),
+        ] == self.flourish.get_handler_for_path('/tags/first/')
+        assert [
+            ('tag-post-detail', {'tag': 'series', 'slug': 'series/part-one'}),
+        ] == self.flourish.get_handler_for_path('/tags/series/series/part-one')
+        assert [
+            ('day-index', {'year': '2016', 'month': '06', 'day': '04'}),
+        ] == self.flourish.get_handler_for_path('/2016/06/04/')
+
+    def test_path_compiled_at_setup(self, monkeypatch):
+        def not_expected(*args, **kwargs):
+            pytest.fail('the path should already be compiled')
+        monkeypatch.setattr(flourish.generators.mixins.re, 'split', not_expected)
+
+        generator = self.flourish._paths['day-index']
+        assert generator.arguments == ['year', 'month', 'day']
+        assert generator.resolve(year=2016, month=6, day='4') == '/2016/06/04/'
+        assert [
+            '/basic-page',
+            '/markdown-page',
+        ] == [source.path for source in self.flourish.sources[0:2]]
+
+    def test_path_compiled_again_when_changed(self):
+        generator = SourceGenerator(path='/#slug', name='changing')
+        assert generator.resolve(slug='one') == '/one'
+        generator.path = '/#category/#slug.html'
+        assert generator.arguments == ['category', 'slug']
+        assert generator.resolve(category='a', slug='one') == '/a/one.html'
+        with pytest.raises(KeyError):
+            generator.resolve(slug='one')
+
+    def test_path_pattern(self):
+        generator = self.flourish._paths['tag-post-detail']
+        pattern = generator.get_path_pattern()
+        match = pattern.match('/tags/css/thing-one')
+        assert match.groupdict() == {'tag': 'css', 'slug': 'thing-one'}
+        assert pattern.match('/series/part-one') is None
+        assert pattern.match('/tags/css/thing-one/extra') is not None
+
 
 class TestFlourishSourcesPath:
     def test_category_prefixed_sources(self):
@@ -2,6 +2,7 @@ import pytest
 import warnings
 
 from flourish import Flourish
+import flourish.sourcelist
 
 from .compare_directories import CompareDirectories
 
@@ -96,6 +97,97 @@ class TestFlourishGeneration(FullGeneration):
         self.compare_directories()
 
 
+class TestParallelGeneration(FullGeneration):
+    def test_generation(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            flourish = Flourish(
+                source_dir='tests/source',
+                templates_dir='tests/templates',
+                sass_dir='tests/sass',
+                output_dir=self.tempdir,
+            )
+            flourish.generate_site(jobs=3)
+
+        self.compare_directories()
+
+    def test_report_matches_serial_generation(self, capsys):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            flourish = Flourish(
+                source_dir='tests/source',
+                templates_dir='tests/templates',
+                sass_dir='tests/sass',
+                output_dir=self.tempdir,
+            )
+            flourish.generate_site(report=True)
+            serial = capsys.readouterr().out
+            flourish.generate_site(report=True, jobs=3)
+            parallel = capsys.readouterr().out
+
+        assert '-> %s/index.html\n' % self.tempdir in serial
+        assert serial == parallel
+
+
+class TestSharedGlobalContext(FullGeneration):
+    def generate(self, unshared=()):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            flourish = Flourish(
+                source_dir='tests/source',
+                templates_dir='tests/templates',
+                sass_dir='tests/sass',
+                output_dir=self.tempdir,
+            )
+            calls = []
+            global_context = flourish.global_context
+
+            def counted(_flourish):
+                calls.append(1)
+                return global_context(_flourish)
+            flourish.set_global_context(counted)
+            for name in unshared:
+                flourish._paths[name].shared_global_context = False
+            flourish.generate_site()
+        return len(calls)
+
+    def test_worked_out_once_per_build(self):
+        assert self.generate() == 1
+        self.compare_directories()
+
+    def test_generators_can_opt_out(self):
+        # once shared, then once for each of the nine source pages
+        assert self.generate(unshared=['source']) == 1 + 9
+        self.compare_directories()
+
+
+class TestCalendarDates(FullGeneration):
+    def test_dates_counted_once_per_generator(self, monkeypatch):
+        indexes = []
+
+        class CountedDateIndex(flourish.sourcelist.DateIndex):
+            def __init__(self, *args, **kwargs):
+                indexes.append(1)
+                super().__init__(*args, **kwargs)
+        monkeypatch.setattr(
+            flourish.sourcelist, 'DateIndex', CountedDateIndex)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _flourish = Flourish(
+                source_dir='tests/source',
+                templates_dir='tests/templates',
+                sass_dir='tests/sass',
+                output_dir=self.tempdir,
+            )
+            _flourish.generate_site()
+
+        # all sources for the global context, then the year and month
+        # calendars, rather than once for each of their five pages
+        assert len(indexes) == 3
+        self.compare_directories()
+
+
 class TestSectileTemplatesGeneration(FullGeneration):
     def test_generation(self):
         with pytest.warns(UserWarning) as warnings:
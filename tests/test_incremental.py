@@ -0,0 +1,156 @@
+import os
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+
+import pytest
+import warnings
+
+from flourish import Flourish
+from flourish.lib import relative_list_of_files_in_directory
+
+
+class TestIncrementalGeneration:
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.source_dir = os.path.join(self.tempdir, 'source')
+        self.output_dir = os.path.join(self.tempdir, 'output')
+        copytree('tests/source', self.source_dir)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def flourish(self, output_dir=None, cache_dir='cache'):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return Flourish(
+                source_dir=self.source_dir,
+                templates_dir='tests/templates',
+                sass_dir='tests/sass',
+                output_dir=output_dir or self.output_dir,
+                cache_dir=os.path.join(self.tempdir, cache_dir),
+            )
+
+    def generate(self, capsys, jobs=1):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish().generate_site(
+                report=True, jobs=jobs, incremental=True)
+        trim = len(self.output_dir) + 1
+        generated = []
+        for line in capsys.readouterr().out.splitlines():
+            action, filename = line.split(' ', 1)
+            generated.append((action, filename[trim:]))
+        return generated
+
+    def assert_same_as_full_generation(self):
+        full_dir = os.path.join(self.tempdir, 'full')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish(full_dir, cache_dir='full-cache').generate_site()
+        files = relative_list_of_files_in_directory(full_dir)
+        assert files == relative_list_of_files_in_directory(self.output_dir)
+        for filename in files:
+            with open(os.path.join(full_dir, filename), 'rb') as handle:
+                expected = handle.read()
+            with open(os.path.join(self.output_dir, filename), 'rb') as handle:
+                assert handle.read() == expected, filename
+
+    def update_source(self, filename, old, new):
+        filename = os.path.join(self.source_dir, filename)
+        with open(filename) as handle:
+            content = handle.read()
+        assert old in content
+        with open(filename, 'w') as handle:
+            handle.write(content.replace(old, new))
+
+    def test_requires_a_cache_directory(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish = Flourish(
+                source_dir=self.source_dir,
+                templates_dir='tests/templates',
+                output_dir=self.output_dir,
+            )
+        with pytest.raises(Flourish.RuntimeError):
+            flourish.generate_site(incremental=True)
+
+    def test_first_generation_is_complete(self, capsys):
+        generated = self.generate(capsys)
+        assert ('->', 'index.html') in generated
+        assert ('++', 'logo.png') in generated
+        self.assert_same_as_full_generation()
+
+    def test_nothing_changed_generates_nothing(self, capsys):
+        self.generate(capsys)
+        assert self.generate(capsys) == []
+
+    def test_changed_source_regenerates_dependent_outputs(self, capsys):
+        self.generate(capsys)
+        self.update_source(
+            'basic-page.toml', "'Basic Page'", "'A Very Basic Page'")
+
+        generated = self.generate(capsys)
+        assert ('->', 'basic-page.html') in generated
+        assert ('->', 'index.html') in generated
+        assert ('->', 'tags/basic-page/index.atom') in generated
+        assert ('->', 'thing-one.html') not in generated
+        assert ('->', 'series/part-two.html') not in generated
+        assert ('->', 'css/screen.css') not in generated
+        self.assert_same_as_full_generation()
+
+    def test_changed_attachment_regenerates_dependent_outputs(self, capsys):
+        self.generate(capsys)
+        self.update_source(
+            'thing-one.body.html', 'This is raw HTML.', 'This is new HTML.')
+
+        generated = self.generate(capsys)
+        assert ('->', 'thing-one.html') in generated
+        assert ('->', 'series/part-two.html') not in generated
+        self.assert_same_as_full_generation()
+
+    def test_changed_template_regenerates_dependent_outputs(self, capsys):
+        templates_dir = os.path.join(self.tempdir, 'templates')
+        copytree('tests/templates', templates_dir)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish = self.flourish()
+        flourish.jinja.loader.searchpath = [templates_dir]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish.generate_site(incremental=True)
+        with open(os.path.join(templates_dir, 'post.html'), 'a') as handle:
+            handle.write('\n')
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish = self.flourish()
+        flourish.jinja.loader.searchpath = [templates_dir]
+        capsys.readouterr()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            flourish.generate_site(report=True, incremental=True)
+        generated = capsys.readouterr().out
+        assert 'thing-one.html' in generated
+        assert 'basic-page.html' not in generated
+
+    def test_removed_source_removes_outputs(self, capsys):
+        self.generate(capsys)
+        os.remove(os.path.join(self.source_dir, 'thing-one.json'))
+        os.remove(os.path.join(self.source_dir, 'thing-one.body.html'))
+        os.remove(os.path.join(self.source_dir, 'logo.png'))
+
+        generated = self.generate(capsys)
+        assert ('--', 'thing-one.html') in generated
+        assert ('--', 'tags/first/index.html') in generated
+        assert ('--', 'logo.png') in generated
+        self.assert_same_as_full_generation()
+
+    def test_parallel_incremental_generation(self, capsys):
+        self.generate(capsys, jobs=3)
+        assert self.generate(capsys, jobs=3) == []
+        self.update_source(
+            'basic-page.toml', "'Basic Page'", "'A Very Basic Page'")
+        generated = self.generate(capsys, jobs=3)
+        assert ('->', 'basic-page.html') in generated
+        assert ('->', 'thing-one.html') not in generated
+        self.assert_same_as_full_generation()
@@ -0,0 +1,158 @@
+from hashlib import md5
+import os
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+
+import pytest
+import warnings
+
+from flourish import Flourish
+from flourish.lib import relative_list_of_files_in_directory
+from flourish.output import OutputManifest, OutputWriter
+
+
+class TestOutputWriter:
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.writer = OutputWriter(batch_size=2)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def read(self, filename, mode='r'):
+        with open(os.path.join(self.tempdir, filename), mode) as handle:
+            return handle.read()
+
+    def test_writes_text_and_bytes(self):
+        self.writer.write(os.path.join(self.tempdir, 'a/b/index.html'), 'é')
+        self.writer.write(os.path.join(self.tempdir, 'a/feed.atom'), b'<a/>')
+        assert self.read('a/b/index.html') == 'é'
+        assert self.read('a/feed.atom', 'rb') == b'<a/>'
+
+    def test_writes_in_background(self):
+        with self.writer.in_background():
+            for number in range(5):
+                filename = os.path.join(self.tempdir, 'dir/%d.html' % number)
+                self.writer.write(filename, str(number))
+        for number in range(5):
+            assert self.read('dir/%d.html' % number) == str(number)
+        assert self.writer._thread is None
+
+    def test_directory_removed_after_it_was_created(self):
+        filename = os.path.join(self.tempdir, 'dir/index.html')
+        self.writer.write(filename, 'one')
+        rmtree(os.path.join(self.tempdir, 'dir'))
+        self.writer.write(filename, 'two')
+        assert self.read('dir/index.html') == 'two'
+
+    def test_background_errors_are_raised(self):
+        os.makedirs(os.path.join(self.tempdir, 'index.html'))
+        with pytest.raises(IsADirectoryError):
+            with self.writer.in_background():
+                self.writer.write(
+                    os.path.join(self.tempdir, 'index.html'), 'page')
+
+
+class TestOutputManifest:
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.source_dir = os.path.join(self.tempdir, 'source')
+        self.output_dir = os.path.join(self.tempdir, 'output')
+        self.cache_dir = os.path.join(self.tempdir, 'cache')
+        copytree('tests/source', self.source_dir)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def generate(self, capsys, jobs=1, incremental=False):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            Flourish(
+                source_dir=self.source_dir,
+                templates_dir='tests/templates',
+                sass_dir='tests/sass',
+                output_dir=self.output_dir,
+                cache_dir=self.cache_dir,
+            ).generate_site(report=True, jobs=jobs, incremental=incremental)
+        return capsys.readouterr().out
+
+    def modified_times(self):
+        times = {}
+        for filename in relative_list_of_files_in_directory(self.output_dir):
+            stat = os.stat(os.path.join(self.output_dir, filename))
+            times[filename] = stat.st_mtime_ns
+        return times
+
+    def test_unchanged_files_are_not_written_again(self, capsys):
+        self.generate(capsys)
+        before = self.modified_times()
+        self.generate(capsys)
+        assert self.modified_times() == before
+
+    def test_unchanged_files_are_not_written_again_in_parallel(self, capsys):
+        self.generate(capsys, jobs=3)
+        before = self.modified_times()
+        self.generate(capsys, jobs=3)
+        assert self.modified_times() == before
+
+    def test_changed_and_stale_files(self, capsys):
+        self.generate(capsys)
+        before = self.modified_times()
+        os.remove(os.path.join(self.source_dir, 'basic-page.toml'))
+        extra = os.path.join(self.output_dir, 'extra.html')
+        with open(extra, 'w') as handle:
+            handle.write('not generated')
+        report = self.generate(capsys)
+
+        after = self.modified_times()
+        assert 'basic-page.html' not in after
+        assert '-- %s/basic-page.html\n' % self.output_dir in report
+        # the index lists every page, so is written again
+        assert after['index.html'] != before['index.html']
+        assert after['css/screen.css'] == before['css/screen.css']
+        # files that were never generated are left alone
+        assert os.path.exists(extra)
+
+    def test_emptied_directories_are_removed(self, capsys):
+        self.generate(capsys)
+        assert os.path.isdir(os.path.join(self.output_dir, 'tags/first'))
+        for filename in ('thing-one.json', 'thing-one.body.html'):
+            os.remove(os.path.join(self.source_dir, filename))
+        self.generate(capsys)
+        assert not os.path.exists(os.path.join(self.output_dir, 'tags/first'))
+        assert os.path.isdir(os.path.join(self.output_dir, 'tags'))
+
+    def test_emptied_directories_are_removed_incrementally(self, capsys):
+        self.generate(capsys, incremental=True)
+        for filename in ('thing-one.json', 'thing-one.body.html'):
+            os.remove(os.path.join(self.source_dir, filename))
+        self.generate(capsys, incremental=True)
+        assert not os.path.exists(os.path.join(self.output_dir, 'tags/first'))
+
+    def test_unchanged_assets_are_not_copied_again(self, capsys):
+        self.generate(capsys)
+        logo = os.path.join(self.output_dir, 'logo.png')
+        before = os.stat(logo).st_mtime_ns
+        self.generate(capsys)
+        assert os.stat(logo).st_mtime_ns == before
+        with open(os.path.join(self.source_dir, 'logo.png'), 'ab') as handle:
+            handle.write(b'changed')
+        self.generate(capsys)
+        with open(logo, 'rb') as handle:
+            assert handle.read().endswith(b'changed')
+
+    def test_digests(self, capsys):
+        self.generate(capsys)
+        manifest = OutputManifest(self.output_dir, self.cache_dir)
+        filename = os.path.join(self.output_dir, 'index.html')
+        with open(filename, 'rb') as handle:
+            content = handle.read()
+        assert manifest.digest(filename) == md5(content).hexdigest()
+        with open(filename, 'ab') as handle:
+            handle.write(b'changed')
+        assert manifest.digest(filename) is None
+
+    def test_other_output_directory_is_wiped(self, capsys):
+        self.generate(capsys)
+        manifest = OutputManifest(self.tempdir, self.cache_dir)
+        assert not manifest.is_complete
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+import pytest
+import toml
+
+import flourish.parsers
+from flourish.parsers import loads_toml, parse_timestamp
+
+
+TOML = '''
+title = "Parsing"
+published = 2016-06-04T10:00:00Z
+updated = 2016-06-05T10:00:00+01:00
+delayed = 2016-06-06T10:00:00.5-05:30
+local = 2016-06-04T10:00:00
+day = 1979-05-27
+tag = ["one", "two"]
+
+[[part]]
+published = 2020-01-01T00:00:00+02:00
+'''
+
+
+def describe(value):
+    if type(value) is dict:
+        return {key: describe(value[key]) for key in value}
+    if type(value) is list:
+        return [describe(item) for item in value]
+    if type(value) is datetime and value.tzinfo is not None:
+        return (value, type(value.tzinfo), value.tzname())
+    return (type(value), value)
+
+
+@pytest.mark.parametrize('tomllib', [flourish.parsers.tomllib, None])
+def test_toml_values_match_toml_package(monkeypatch, tomllib):
+    monkeypatch.setattr(flourish.parsers, 'tomllib', tomllib)
+    assert describe(loads_toml(TOML)) == describe(toml.loads(TOML))
+
+
+def test_invalid_toml_is_a_value_error():
+    with pytest.raises(ValueError):
+        loads_toml('title = ')
+
+
+@pytest.mark.parametrize('value, expected', [
+    (
+        '2016-06-04T10:00:00Z',
+        datetime(2016, 6, 4, 10, 0, tzinfo=timezone.utc),
+    ),
+    ('2016-06-04', '2016-06-04'),
+    ('not a timestamp at all', 'not a timestamp at all'),
+    (1, 1),
+    (None, None),
+])
+def test_parse_timestamp(value, expected):
+    assert parse_timestamp(value) == expected
@@ -0,0 +1,138 @@
+import os
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+
+import pytest
+import warnings
+
+import flourish.source
+from flourish import Flourish
+from flourish.parallel import load_in_parallel
+
+
+class TestSourceCache:
+    PARSERS = (
+        (flourish.source.SourceFile, '_read_configuration'),
+        (flourish.source.MarkdownSourceFile, '_read_configuration'),
+        (flourish.source.JsonSourceFile, '_read_configuration'),
+        (flourish.source.CsvSourceFile, '_read_file'),
+        (flourish.source.markdown2, 'markdown'),
+    )
+
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.source_dir = os.path.join(self.tempdir, 'source')
+        self.cache_dir = os.path.join(self.tempdir, '.flourish-cache')
+        copytree('tests/source', self.source_dir)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def load(self, **kwargs):
+        with warnings.catch_warnings(record=True) as record:
+            warnings.simplefilter('always')
+            _flourish = Flourish(
+                self.source_dir, cache_dir=self.cache_dir, **kwargs)
+        return _flourish, [str(item.message) for item in record]
+
+    def test_unchanged_sources_are_not_parsed_again(self, monkeypatch):
+        first, first_warnings = self.load()
+        assert os.path.exists(
+            os.path.join(self.cache_dir, 'sources.pickle'))
+
+        def not_expected(*args, **kwargs):
+            pytest.fail('sources should have come from the cache')
+        for parser in self.PARSERS:
+            monkeypatch.setattr(*parser, not_expected)
+
+        second, second_warnings = self.load()
+        assert first_warnings == second_warnings
+        assert (
+            [(src.slug, src.get_config()) for src in first.sources] ==
+            [(src.slug, src.get_config()) for src in second.sources]
+        )
+        assert type(second.get('thing-one')) is type(first.get('thing-one'))
+        assert second.get('series/part-one').index.slug == 'series/index'
+
+    def test_touched_sources_are_not_parsed_again(self, monkeypatch):
+        self.load()
+        os.utime(os.path.join(self.source_dir, 'basic-page.toml'), (0, 0))
+
+        monkeypatch.setattr(
+            flourish.source.SourceFile,
+            '_read_configuration',
+            lambda *args: pytest.fail('basic-page should be cached'),
+        )
+        _flourish, _ = self.load()
+        assert _flourish.get('basic-page').title == 'Basic Page'
+
+    def test_changed_attachments_are_parsed_again(self):
+        self.load()
+        attachment = os.path.join(self.source_dir, 'thing-one.body.html')
+        with open(attachment, 'w') as handle:
+            handle.write('<p>Changed.</p>\n')
+
+        _flourish, _ = self.load()
+        assert _flourish.get('thing-one').body == '<p>Changed.</p>\n'
+
+    def test_new_attachments_are_found(self):
+        self.load()
+        attachment = os.path.join(self.source_dir, 'basic-page.extra.html')
+        with open(attachment, 'w') as handle:
+            handle.write('<p>Extra.</p>\n')
+
+        _flourish, _ = self.load()
+        assert _flourish.get('basic-page').extra == '<p>Extra.</p>\n'
+
+    def test_changed_settings_parse_again(self):
+        self.load()
+        _flourish, _ = self.load(keep_markdown=False)
+        assert 'body_markdown' not in _flourish.get('series/part-one')._config
+        _flourish, _ = self.load()
+        assert 'body_markdown' in _flourish.get('series/part-one')._config
+
+
+class TestParallelLoading:
+    def load(self, source_dir='tests/source', **kwargs):
+        with warnings.catch_warnings(record=True) as record:
+            warnings.simplefilter('always')
+            _flourish = Flourish(source_dir, **kwargs)
+        return _flourish, [str(item.message) for item in record]
+
+    def sources(self, _flourish):
+        return [
+            (type(src), src.slug, src.get_config())
+            for src in _flourish.sources
+        ]
+
+    def test_same_sources_as_reading_in_turn(self, monkeypatch):
+        serial, serial_warnings = self.load()
+
+        prefetched = []
+
+        def recording(*args, **kwargs):
+            loaded = load_in_parallel(*args, **kwargs)
+            prefetched.extend(loaded)
+            return loaded
+        monkeypatch.setattr(flourish, 'load_in_parallel', recording)
+        parallel, parallel_warnings = self.load(load_jobs=3)
+        assert len(prefetched) == 13
+        assert serial_warnings == parallel_warnings
+        assert self.sources(serial) == self.sources(parallel)
+        assert parallel.get('series/part-one').index.slug == 'series/index'
+        assert parallel._prefetched == {}
+
+    def test_parallel_with_cache(self):
+        tempdir = mkdtemp()
+        try:
+            source_dir = os.path.join(tempdir, 'source')
+            cache_dir = os.path.join(tempdir, '.flourish-cache')
+            copytree('tests/source', source_dir)
+            first, first_warnings = self.load(
+                source_dir, cache_dir=cache_dir, load_jobs=2)
+            second, second_warnings = self.load(
+                source_dir, cache_dir=cache_dir, load_jobs=2)
+            assert first_warnings == second_warnings
+            assert self.sources(first) == self.sources(second)
+        finally:
+            rmtree(tempdir)
@@ -0,0 +1,144 @@
+from datetime import datetime, timezone
+import os
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+
+import pytest
+import warnings
+
+from flourish import Flourish
+
+
+class TestSourceIndex:
+    FILTERS = (
+        {'tag': 'series'},
+        {'tag__eq': 'basically'},
+        {'tag': 'series', 'page_type': 'post'},
+        {'tag': 'nope'},
+        {'category': 'thing', 'line': 'two-things'},
+        {'title': ''},
+        {'slug': 'thing-one'},
+        {'slug__in': ['thing-one', 'series/index', 'nope']},
+        {'category__in': ('article', 'static')},
+        {'updated__set': ''},
+        {'updated__unset': ''},
+        {'published__set': '', 'tag': 'two'},
+        {'year': '2016'},
+        {'year': '2016', 'month': '06'},
+        {'year': '2016', 'month': '06', 'day': '04'},
+        {'year': '2016', 'tag': 'series'},
+        {'index_fkey': 'series/index'},
+        {'published': datetime(2016, 6, 4, 12, 30, 0, tzinfo=timezone.utc)},
+        {'tag__in': [['series', 'one']]},
+        {'tag': ['series', 'one']},
+        {'tag__contains': 'ser'},
+    )
+
+    @classmethod
+    def setup_class(cls):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.indexed = Flourish('tests/source')
+            cls.unindexed = Flourish('tests/source', indexed=False)
+
+    @pytest.mark.parametrize('_filter', FILTERS)
+    def test_same_results_as_unindexed(self, _filter):
+        indexed = self.indexed.sources.filter(**_filter)
+        unindexed = self.unindexed.sources.filter(**_filter)
+        assert (
+            [source.slug for source in indexed] ==
+            [source.slug for source in unindexed]
+        )
+
+    @pytest.mark.parametrize('_filter', FILTERS)
+    def test_same_excluded_results_as_unindexed(self, _filter):
+        indexed = self.indexed.sources.exclude(**_filter)
+        unindexed = self.unindexed.sources.exclude(**_filter)
+        assert (
+            [source.slug for source in indexed] ==
+            [source.slug for source in unindexed]
+        )
+
+    def test_same_valid_filters_as_unindexed(self):
+        for name in ('tag-post-detail', 'day-index', 'source'):
+            assert (
+                self.indexed.all_valid_filters_for_path(name) ==
+                self.unindexed.all_valid_filters_for_path(name)
+            )
+
+    def test_index_is_used(self):
+        index = self.indexed.get_source_index()
+        assert index.lookup('tag', 'series') is not None
+        assert index.lookup('year', '2016') is not None
+        assert index.lookup('tag__contains', 'ser') is None
+        assert index.lookup('path', '/thing-one') is None
+        assert index.lookup('index_set__set', '') is None
+
+        sources = self.indexed.sources.filter(tag='two', year='2016')
+        assert sources.get_index() is index
+        assert index.filter(sources.filters)[1] == []
+
+    def test_unindexed_has_no_index(self):
+        assert self.unindexed.get_source_index() is None
+
+    def test_reverse_lookups_use_index(self):
+        index = self.indexed.get_source_index()
+        parent = self.indexed.get('series/index')
+        assert len(index.lookup('index_fkey', 'series/index')) == 3
+        assert (
+            [source.slug for source in parent.index_set] ==
+            [
+                source.slug
+                for source in self.unindexed.get('series/index').index_set
+            ]
+        )
+        page = self.indexed.get('thing-one')
+        assert (
+            [source.slug for source in page.related('category')] ==
+            [
+                source.slug
+                for source in self.unindexed.get('thing-one').related(
+                    'category')
+            ]
+        )
+
+
+class TestSourceIndexRescan:
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.source_dir = os.path.join(self.tempdir, 'source')
+        copytree('tests/source', self.source_dir)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish = Flourish(self.source_dir)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def test_index_updated_on_rescan(self):
+        # index some fields before the sources change
+        for _filter in TestSourceIndex.FILTERS:
+            list(self.flourish.sources.filter(**_filter))
+        index = self.flourish.get_source_index()
+
+        with open(os.path.join(self.source_dir, 'new.toml'), 'w') as handle:
+            handle.write(
+                'title = "New"\n'
+                'tag = ["series", "new"]\n'
+                'index_fkey = "series/index"\n'
+                'published = 2016-06-04T09:00:00Z\n'
+            )
+        os.remove(os.path.join(self.source_dir, 'thing-one.json'))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.flourish._rescan_sources()
+            unindexed = Flourish(self.source_dir, indexed=False)
+
+        assert self.flourish.get_source_index() is index
+        for _filter in TestSourceIndex.FILTERS:
+            assert (
+                [src.slug for src in self.flourish.sources.filter(**_filter)]
+                == [src.slug for src in unindexed.sources.filter(**_filter)]
+            )
+        assert 'new' in [
+            src.slug for src in self.flourish.get('series/index').index_set]
@@ -1,11 +1,14 @@
 # encoding: utf-8
 
 from datetime import datetime, timezone
+import pickle
 
 import pytest
 import warnings
 
 from flourish import Flourish
+import flourish.source
+from flourish.generators.base import SourceGenerator
 
 
 class TestFlourishPageInvalidFrontmatter:
@@ -33,7 +36,7 @@ class TestFlourishPage:
                 'previous_slug': [
                     '/page',
                 ],
-            } == page._config
+            } == page.get_config()
 
     def test_toml_with_inherent_markdown(self):
         page = self.flourish.get('series/part-one')
@@ -48,7 +51,7 @@ class TestFlourishPage:
                 'tag': ['series', 'one'],
                 'title': 'Part One',
                 'page_type': 'post',
-            } == page._config
+            } == page.get_config()
 
         page = self.flourish.get('thing-two')
         assert {
@@ -63,7 +66,7 @@ class TestFlourishPage:
                 'tag': ['basically', 'second', 'two'],
                 'title': 'Second Thing',
                 'page_type': 'post',
-            } == page._config
+            } == page.get_config()
 
     def test_toml_with_inherent_markdown_overridden_by_adherent(self):
         page = self.flourish.get('series/part-three')
@@ -80,7 +83,7 @@ class TestFlourishPage:
                 'tag': ['three', 'series'],
                 'title': 'Part Three',
                 'page_type': 'post',
-            } == page._config
+            } == page.get_config()
 
     def test_toml_with_adherent_markdown(self):
         page = self.flourish.get('series/part-two')
@@ -97,7 +100,7 @@ class TestFlourishPage:
                 'tag': ['series', 'two'],
                 'title': 'Part Two',
                 'page_type': 'post',
-            } == page._config
+            } == page.get_config()
 
     def test_page_markdown_with_frontmatter(self):
         page = self.flourish.get('markdown-page')
@@ -112,7 +115,7 @@ class TestFlourishPage:
                 'published': datetime(
                     2016, 2, 29, 10, 30, 0, tzinfo=timezone.utc),
                 'title': 'Plain Markdown Page',
-            } == page._config
+            } == page.get_config()
 
     def test_json_with_adherent_html(self):
         page = self.flourish.get('thing-one')
@@ -128,4 +131,254 @@ class TestFlourishPage:
                 'page_type': 'post',
                 'updated': datetime(
                     2016, 6, 4, 14, 0, 0, tzinfo=timezone.utc),
-            } == page._config
+            } == page.get_config()
+
+
+class TestFlourishPagePath:
+    def setup_method(self, meth):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.flourish = Flourish('tests/source')
+
+    def test_path_is_remembered(self, monkeypatch):
+        page = self.flourish.get('thing-one')
+        assert page.path == '/thing-one'
+        assert page.absolute_url == 'http://withaflourish.net/thing-one'
+
+        def not_expected(**kwargs):
+            pytest.fail('the path should have been remembered')
+        monkeypatch.setattr(
+            self.flourish._source_path, 'resolve', not_expected)
+        assert page.path == '/thing-one'
+        assert page.absolute_url == 'http://withaflourish.net/thing-one'
+
+    def test_path_changes_with_source_path(self):
+        page = self.flourish.get('series/index')
+        assert page.path == '/series/'
+
+        self.flourish.add_path(
+            SourceGenerator(
+                path = '/#category/#slug.html',
+                name = 'source',
+            ),
+        )
+        assert page.path == '/article/series/index.html'
+
+        self.flourish._source_path.path = '/#slug/'
+        assert page.path == '/series/index/'
+
+    def test_path_not_in_cached_state(self):
+        page = self.flourish.get('thing-one')
+        assert page.path == '/thing-one'
+        assert '_path_memo' not in page._get_cached_state()
+
+
+class TestFlourishPageMarkdown:
+    def setup_method(self, meth):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.flourish = Flourish('tests/source')
+
+    def test_markdown_converted_when_first_used(self, monkeypatch):
+        page = self.flourish.get('series/part-one')
+        assert 'body' not in page._config
+        assert 'body' in page
+        assert 'body' in list(page)
+
+        converted = []
+        markdown = flourish.source.markdown2.markdown
+
+        def counting_markdown(text):
+            converted.append(text)
+            return markdown(text)
+        monkeypatch.setattr(
+            flourish.source.markdown2, 'markdown', counting_markdown)
+
+        body = '<h1>Part One</h1>\n\n<p>I come from Markdown.</p>\n'
+        assert page.body == body
+        assert page['body'] == body
+        assert page._config['body'] == body
+        assert len(converted) == 1
+
+    def test_markdown_conversion_overrides_existing_value(self):
+        page = self.flourish.get('series/part-two')
+        assert page.body.startswith('<h1>Part Two</h1>')
+
+    def test_html_attachment_overrides_markdown(self):
+        page = self.flourish.get('thing-one')
+        assert page.body == (
+            '<h1>Thing the First</h1>\n'
+            '<p>This is raw HTML.</p>\n'
+        )
+
+    def test_unconverted_config_is_stable(self):
+        page = self.flourish.get('thing-two')
+        before = dict(page._get_unconverted_config())
+        page.get_config()
+        assert 'summary' in page._config
+        assert before == page._get_unconverted_config()
+
+
+class TestFlourishPageCompact:
+    def test_sources_have_no_instance_dict(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _flourish = Flourish('tests/source')
+        for source in _flourish.sources:
+            assert not hasattr(source, '__dict__')
+
+        page = _flourish.get('series/part-one')
+        state = page._get_cached_state()
+        assert '_parent' not in state
+        restored = type(page)._from_cached_state(_flourish, state)
+        assert restored._config == page._config
+        assert restored.slug == page.slug
+        assert restored.timestamp == page.timestamp
+
+    def test_csv_rows_share_key_names(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _flourish = Flourish('tests/source')
+        rows = [
+            source for source in _flourish.sources
+            if type(source).__name__ == 'CsvRowSource'
+        ]
+        assert len(rows) > 1
+        keys = [
+            {key: key for key in row._config}
+            for row in rows
+        ]
+        for key in keys[0]:
+            if key in keys[1]:
+                assert keys[0][key] is keys[1][key]
+
+    def test_markdown_can_be_dropped_after_conversion(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _flourish = Flourish('tests/source', keep_markdown=False)
+        page = _flourish.get('series/part-one')
+        assert 'body_markdown' not in page._config
+        assert page.body == '<h1>Part One</h1>\n\n<p>I come from Markdown.</p>\n'
+        page = _flourish.get('markdown-page')
+        assert 'body_markdown' not in page._config
+        assert page.body
+
+
+class TestFlourishCsvRows:
+    def test_columns_converted_in_every_row(self, tmp_path):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _flourish = Flourish('tests/source')
+        _flourish.source_dir = str(tmp_path)
+        _flourish._attachment_index = {}
+        (tmp_path / 'rows.csv').write_text(
+            'slug,updated,note,tag[]\n'
+            'one,never,2020-01-01,"a,b"\n'
+            'two,,,c:d\n'
+            'three,2021-02-03T04:05:06Z,2021-02-03 04:05:06,e\n'
+        )
+        rows = flourish.source.CsvSourceFile.read_sources(
+            _flourish, 'rows.csv')
+        assert [row._config for row in rows] == [
+            {'updated': 'never', 'note': '2020-01-01', 'tag': ['a', 'b']},
+            {'updated': '', 'note': '', 'tag': ['c', 'd']},
+            {
+                'updated': datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+                'note': '2021-02-03 04:05:06',
+                'tag': ['e'],
+            },
+        ]
+        assert [list(row._config) for row in rows][0] == [
+            'updated', 'note', 'tag']
+
+    def read_rows(self, tmp_path, content, index=None):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            _flourish = Flourish('tests/source')
+        _flourish.source_dir = str(tmp_path)
+        _flourish._attachment_index = index if index is not None else {}
+        (tmp_path / 'rows.csv').write_text(content)
+        return flourish.source.CsvSourceFile.read_sources(
+            _flourish, 'rows.csv')
+
+    def test_rows_are_read_from_columns_when_used(self, tmp_path):
+        rows = self.read_rows(
+            tmp_path,
+            'slug,title,published\n'
+            '/one,One,2021-02-03T04:05:06Z\n'
+            '\n'
+            'two/,Two\n'
+        )
+        assert [row.slug for row in rows] == ['one', 'two/index']
+        assert [row._row[1] for row in rows] == [0, 1]
+        assert rows[0].title == 'One'
+        assert rows[0]._row is None
+        assert rows[1]._row is not None
+        assert rows[1]._config == {'title': 'Two', 'published': None}
+        assert rows[0]._config == {
+            'title': 'One',
+            'published': datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+        }
+
+    def test_unread_rows_are_cached_by_column(self, tmp_path):
+        rows = self.read_rows(tmp_path, 'slug,title\none,One\ntwo,Two\n')
+        states = pickle.loads(pickle.dumps(
+            [row._get_cached_state() for row in rows]))
+        assert states[0]['_row'][0] is states[1]['_row'][0]
+        restored = [
+            flourish.source.CsvRowSource._from_cached_state(None, state)
+            for state in states
+        ]
+        assert [row._config for row in restored] == [
+            {'title': 'One'}, {'title': 'Two'}]
+
+    def test_rows_with_attachments_are_read_at_once(self, tmp_path):
+        (tmp_path / 'two.body.html').write_text('<p>Two</p>')
+        # warned about as the file is read, as before
+        with pytest.warns(UserWarning, match='overriden by HTML attachment'):
+            rows = self.read_rows(
+                tmp_path,
+                'slug,title,body\none,One,\ntwo,Two,Body\n',
+                index={('two', 'html'): ['two.body.html']},
+            )
+        assert rows[0]._row is not None
+        assert rows[1]._row is None
+        assert rows[1]._attachments == ['two.body.html']
+        assert rows[1].body == '<p>Two</p>'
+
+
+class TestFlourishPageAttachments:
+    def test_attachments_found_without_searching(self, monkeypatch):
+        monkeypatch.setattr(
+            flourish.source,
+            'glob',
+            lambda *args: pytest.fail('attachments should be indexed'),
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            _flourish = Flourish('tests/source')
+        page = _flourish.get('thing-two')
+        assert page._attachments == [
+            'thing-two.body.markdown',
+            'thing-two.summary.markdown',
+        ]
+        assert page.summary.startswith('<p>')
+
+    def test_index_matches_find_attachments(self):
+        filenames = [
+            'a.body.html',
+            'a.b.summary.markdown',
+            'a.b.toml',
+            'a.toml',
+            'dir/c.body.markdown',
+            'notes.markdown',
+        ]
+        index = flourish.source.index_attachments(filenames)
+        assert index == {
+            ('a', 'html'): ['a.body.html'],
+            ('a', 'markdown'): ['a.b.summary.markdown'],
+            ('a.b', 'markdown'): ['a.b.summary.markdown'],
+            ('dir/c', 'markdown'): ['dir/c.body.markdown'],
+        }
+        assert flourish.source.find_attachments(
+            'tests/source', 'series/index', 'html', index) == []
@@ -0,0 +1,74 @@
+import os
+import time
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+
+import warnings
+
+from flourish import Flourish
+from flourish.watcher import SourceWatcher
+
+
+class TestSourceWatcher:
+    def setup_method(self, meth):
+        self.tempdir = mkdtemp()
+        self.source_dir = os.path.join(self.tempdir, 'source')
+        copytree('tests/source', self.source_dir)
+        self.watcher = SourceWatcher(self.source_dir)
+
+    def teardown_method(self, meth):
+        rmtree(self.tempdir)
+
+    def test_nothing_changed(self):
+        self.watcher.poll()
+        assert not self.watcher.has_changed()
+
+    def test_new_file_in_subdirectory(self):
+        filename = os.path.join(self.source_dir, 'series/part-four.toml')
+        with open(filename, 'w') as handle:
+            handle.write('title = "Part Four"\n')
+        self.watcher.poll()
+        assert self.watcher.has_changed()
+        # only reported once
+        self.watcher.poll()
+        assert not self.watcher.has_changed()
+
+    def test_changed_file(self):
+        filename = os.path.join(self.source_dir, 'thing-one.body.html')
+        os.utime(filename, (0, 0))
+        self.watcher.poll()
+        assert self.watcher.has_changed()
+
+    def test_removed_file(self):
+        os.remove(os.path.join(self.source_dir, 'nothing.toml'))
+        self.watcher.poll()
+        assert self.watcher.has_changed()
+
+    def test_polled_in_the_background(self):
+        self.watcher.interval = 0.01
+        self.watcher.start()
+        try:
+            os.remove(os.path.join(self.source_dir, 'nothing.toml'))
+            deadline = time.time() + 5
+            while not self.watcher.has_changed():
+                assert time.time() < deadline
+                time.sleep(0.01)
+        finally:
+            self.watcher.stop()
+
+    def test_sources_only_scanned_again_after_a_change(self, monkeypatch):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            _flourish = Flourish(self.source_dir, reloading=True)
+        _flourish._watcher = self.watcher
+        rescans = []
+        monkeypatch.setattr(
+            _flourish, '_rescan_sources', lambda: rescans.append(1))
+
+        _flourish.generate_path('/not-a-page')
+        assert rescans == []
+
+        os.remove(os.path.join(self.source_dir, 'nothing.toml'))
+        self.watcher.poll()
+        _flourish.generate_path('/not-a-page')
+        assert rescans == [1]